@@ -1,11 +1,27 @@
-from genetic_algorithm import GeneticAlgorithm, Population
+import json
+import os
 import random
+from collections import namedtuple
 
-from flask import Flask, redirect, render_template, request
+from flask import Flask, Response, abort, redirect, render_template, request, stream_with_context
 
-from schedule import Class, Course, Lecturer, Room, Schedule
+from checkpoint import config_fingerprint
+from constraints import Stability
+from genetic_algorithm import RunConfig
+from jobs import Job, JobLimitError, JobManager
+from profiling import metrics
+from schedule import ProblemInstance
+from view_model import view_cache
 
 app = Flask(__name__)
+job_manager = JobManager(max_workers=1, max_active=2)
+# Mỗi bộ tham số tìm kiếm có 1 file checkpoint riêng (checkpoint.config_fingerprint)
+CHECKPOINT_PATH = "./data/checkpoint-{:08x}.bin"
+
+ColoredClass = namedtuple("ColoredClass", ["clas", "color"])
+
+if os.environ.get("SCHEDULE_METRICS"):
+    metrics.enable()
 
 @app.route('/')
 def index():
@@ -14,84 +30,157 @@ def index():
 
 @app.route('/course')
 def course():
-    courses = Course.load()
+    courses = view_cache.courses()
     return render_template('course.html', courses=courses)
 
 
 @app.route('/schedule')
 def schedule():
-    classes = Schedule.load()
-    num_conflict = 0
-    for i in range(len(classes)):
-        classes[i].time = Class.DAYS[classes[i].day] + " " + classes[i].shift.time
-        if classes[i].conflict:
-            num_conflict += 1
-    return render_template('schedule.html', classes=classes, num_conflict=num_conflict)
+    schedule_view = view_cache.schedule()
+    return render_template('schedule.html', classes=schedule_view.classes, num_conflict=schedule_view.num_conflict)
 
 
 @app.route('/lecturer')
 def lecturer():
-    lecturers = Lecturer.load()
+    lecturers = view_cache.lecturers()
     return render_template('lecturer.html', lecturers=lecturers)
 
 
 @app.route('/room')
 def room():
-    rooms = Room.load()
+    rooms = view_cache.rooms()
     return render_template('room.html', rooms=rooms)
 
 
 @app.route('/schedule-table')
 def schedule_table():
-    classes = Schedule.load()
-    if request.args.get("lecturer"):
-        arg = request.args.get("lecturer")
-        classes = filter(lambda x: x.lecturer.id == arg, classes)
-        classes = list(classes)
-    elif request.args.get("course"):
-        arg = request.args.get("course")
-        classes = filter(lambda x: x.course.id == arg, classes)
-        classes = list(classes)
-    elif request.args.get("room"):
-        arg = request.args.get("room")
-        classes = filter(lambda x: x.room.name == arg, classes)
-        classes = list(classes)
-
-    colors = ["#"+''.join([random.choice('0123456789ABCDEF')
+    schedule_view = view_cache.schedule()
+    classes = schedule_view.filter(
+        lecturer=request.args.get("lecturer"),
+        course=request.args.get("course"),
+        room=request.args.get("room"),
+    )
+    slots = schedule_view.by_slot if classes is schedule_view.classes else schedule_view.group_by_slot(classes)
+
+    rng = random.Random(0)
+    colors = ["#"+''.join([rng.choice('0123456789ABCDEF')
                            for j in range(6)]) for i in range(len(classes))]
     count = 0
     rows = []
     for i in range(0, 15):
         cols = []
         for j in range(0, 7):
-            _classes = [clas for clas in classes if clas.day == j and clas.shift.id - 1 == i // 3]
+            _classes = slots.get((j, i // 3 + 1))
 
-            if len(_classes) != 0:
+            if _classes:
                 if i % 3 == 0:
-                    for k in range(len(_classes)):
-                        _classes[k].color = colors[count]
+                    cells = []
+                    for clas in _classes:
+                        cells.append(ColoredClass(clas, colors[count]))
                         count += 1
-                    cols.append(_classes)
+                    cols.append(cells)
             else:
                 cols.append(None)
         rows.append(cols)
 
-    for i in range(len(classes)):
-        classes[i].time = Class.DAYS[classes[i].day] + \
-            " " + classes[i].shift.time
     return render_template('schedule-table.html', classes=classes, rows=rows)
 
-@app.route('/api/process')
-def process():
-    population = Population(size=10)
-    population.chromosomes.sort(key=lambda x: x.get_fitness(), reverse=True)
-    genetic_algorithm = GeneticAlgorithm()
-    for _ in range(50):
-        population = genetic_algorithm.evolve(population)
-        if population.chromosomes[0].get_fitness() == 1.0:
-            break
-    population.chromosomes[0].save()
-    return {"message": "Successfully"}
+@app.route('/api/process', methods=['GET', 'POST'])
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    params = dict(request.get_json(silent=True) or {})
+    params.update(request.args.items())
+    try:
+        config = RunConfig.from_dict(params)
+        stability_weight = params.get("stability_weight")
+        stability_weight = Stability.weight if stability_weight in (None, "") else float(stability_weight)
+        if stability_weight < 0:
+            raise ValueError("stability_weight must not be negative")
+    except (TypeError, ValueError) as e:
+        return {"message": str(e)}, 400
+    try:
+        job = job_manager.submit(Job(
+            config=config,
+            checkpoint_path=CHECKPOINT_PATH.format(config_fingerprint(config)),
+            checkpoint_interval=request.args.get("checkpoint_interval", 10, type=int),
+            resume=request.args.get("resume") in ("1", "true"),
+            warm_start=request.args.get("warm_start") in ("1", "true"),
+            stability_weight=stability_weight,
+        ))
+    except JobLimitError as e:
+        return {"message": str(e)}, 429
+    return job.to_dict(), 202
+
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        abort(404)
+    data = job.to_dict()
+    since = request.args.get("since", type=int)
+    if since is not None:
+        # Chỉ trả về các thế hệ sau `since`, trạng thái mới nhất đã có trong "progress"
+        data["history"] = job.history(since)
+    return data
+
+
+@app.route('/api/jobs/<job_id>/events')
+def stream_job_events(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        abort(404)
+
+    def generate():
+        for event in job.events():
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield "event: generation\ndata: {}\n\n".format(json.dumps(event))
+        yield "event: end\ndata: {}\n\n".format(json.dumps(job.to_dict()))
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        abort(404)
+    return job.to_dict()
+
+
+@app.route('/api/jobs/<job_id>/result')
+def get_job_result(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        abort(404)
+    if job.result is None:
+        return {"message": "Job is {}".format(job.status)}, 409
+    return {
+        "fitness": job.result.get_fitness(),
+        "num_conflicts": job.result.get_num_conflicts(),
+        "classes": [clas.to_dict() for clas in job.result.classes],
+    }
+
+
+@app.route('/api/metrics')
+def get_metrics():
+    return dict(metrics.report(), fitness_cache=ProblemInstance.load().fitness_cache.stats())
+
+
+@app.route('/api/metrics', methods=['POST'])
+def update_metrics():
+    if request.args.get("reset"):
+        metrics.reset()
+    if request.args.get("enabled") is not None:
+        if request.args.get("enabled") in ("1", "true"):
+            metrics.enable()
+        else:
+            metrics.disable()
+    return metrics.report()
 
 if __name__ == "__main__":
     app.run(use_reloader=True)
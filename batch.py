@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+from prettytable import PrettyTable
+
+from genetic_algorithm import GeneticAlgorithm, Population, RunConfig
+from schedule import ProblemInstance, derive_rng
+
+
+class BatchEntry:
+    """1 bộ dữ liệu cần giải trong chế độ chạy hàng loạt
+
+     Attributes:
+        - name (str): tên bộ dữ liệu trong bảng tổng hợp
+        - data_dir (str): thư mục chứa courses.json, rooms.json, lecturers.json, shifts.json
+        - output (str): file ghi lịch học tốt nhất
+        - config (RunConfig): tham số (và giới hạn chạy) riêng của bộ dữ liệu
+    """
+
+    def __init__(self, name: str, data_dir: str, output: str, config: RunConfig) -> None:
+        self.name = name
+        self.data_dir = data_dir
+        self.output = output
+        self.config = config
+
+
+class BatchResult:
+    """Kết quả giải 1 bộ dữ liệu, error khác None nếu bị lỗi"""
+
+    def __init__(self, name: str, output: str, fitness: Optional[float] = None, num_conflicts: Optional[int] = None,
+                 generations: int = 0, stop_reason: Optional[str] = None, elapsed: float = 0.0,
+                 error: Optional[str] = None) -> None:
+        self.name = name
+        self.output = output
+        self.fitness = fitness
+        self.num_conflicts = num_conflicts
+        self.generations = generations
+        self.stop_reason = stop_reason
+        self.elapsed = elapsed
+        self.error = error
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+def _solve(entry: BatchEntry) -> BatchResult:
+    """Giải 1 bộ dữ liệu trong tiến trình con và ghi kết quả ra entry.output"""
+    start = time.perf_counter()
+    try:
+        config = entry.config
+        problem = ProblemInstance.load(entry.data_dir)
+        rng = derive_rng(config.seed)
+        genetic_algorithm = GeneticAlgorithm(problem, rng=rng, config=config)
+        population = Population(config.population_size, problem, rng, config.initialization,
+                                genetic_algorithm.constraints)
+        population = genetic_algorithm.run(population)
+        best = population.chromosomes[0]
+        directory = os.path.dirname(os.path.abspath(entry.output))
+        os.makedirs(directory, exist_ok=True)
+        best.save(entry.output)
+        return BatchResult(entry.name, entry.output, best.get_fitness(), best.get_num_conflicts(),
+                           genetic_algorithm.generation, genetic_algorithm.stop_reason, time.perf_counter() - start)
+    except Exception as e:
+        return BatchResult(entry.name, entry.output, elapsed=time.perf_counter() - start, error=str(e))
+
+
+def _entry_config(data: Mapping[str, Any], defaults: RunConfig) -> RunConfig:
+    """RunConfig của 1 bộ dữ liệu: tham số mặc định, ghi đè bởi các khoá của `data`"""
+    config = {name: value for name, value in defaults.to_dict().items() if value is not None}
+    config.update(data)
+    return RunConfig.from_dict(config)
+
+
+def read_manifest(filepath: str, defaults: RunConfig, output_dir: Optional[str] = None) -> List[BatchEntry]:
+    """Đọc danh sách bộ dữ liệu từ file manifest JSON
+
+    File là 1 danh sách (hoặc {"instances": [...]}) các đối tượng gồm
+    "data_dir", "name" và "output" (không bắt buộc), các khoá còn lại là
+    tham số của RunConfig (vd: "time_budget", "num_generations") cho riêng bộ
+    dữ liệu đó. Đường dẫn tương đối được tính từ thư mục của file manifest.
+    """
+    with open(filepath) as file_json:
+        data = json.load(file_json)
+    if isinstance(data, Mapping):
+        data = data["instances"]
+    base_dir = os.path.dirname(os.path.abspath(filepath))
+    entries = []
+    for item in data:
+        item = dict(item)
+        data_dir = os.path.join(base_dir, item.pop("data_dir"))
+        name = item.pop("name", None) or os.path.basename(os.path.normpath(data_dir))
+        output = item.pop("output", None)
+        if output is not None:
+            output = os.path.join(base_dir, output)
+        entries.append(BatchEntry(name, data_dir, output or default_output(name, data_dir, output_dir),
+                                  _entry_config(item, defaults)))
+    return entries
+
+
+def discover(directory: str, defaults: RunConfig, output_dir: Optional[str] = None) -> List[BatchEntry]:
+    """Tìm các thư mục con có đủ file dữ liệu (ProblemInstance.FILES), theo thứ tự tên"""
+    entries = []
+    for name in sorted(os.listdir(directory)):
+        data_dir = os.path.join(directory, name)
+        if all(os.path.isfile(os.path.join(data_dir, filename)) for filename in ProblemInstance.FILES):
+            entries.append(BatchEntry(name, data_dir, default_output(name, data_dir, output_dir), defaults))
+    return entries
+
+
+def default_output(name: str, data_dir: str, output_dir: Optional[str] = None) -> str:
+    """<output_dir>/<name>.json, hoặc results.json trong thư mục dữ liệu nếu không có output_dir"""
+    if output_dir is not None:
+        return os.path.join(output_dir, name + ".json")
+    return os.path.join(data_dir, "results.json")
+
+
+class BatchRunner:
+    """Giải nhiều bộ dữ liệu đồng thời trên 1 nhóm tiến trình dùng chung
+
+    Mỗi bộ dữ liệu là 1 tác vụ chạy trọn trong 1 tiến trình với giới hạn
+    chạy trong RunConfig của nó, nên bộ dữ liệu lớn không chặn các bộ khác.
+    Lỗi của 1 bộ dữ liệu được ghi vào kết quả, không dừng cả lần chạy.
+
+     Attributes:
+        - entries (List[BatchEntry]): các bộ dữ liệu cần giải
+        - num_workers (int): số tiến trình, mặc định bằng số CPU
+    """
+
+    def __init__(self, entries: List[BatchEntry], num_workers: Optional[int] = None) -> None:
+        outputs = [os.path.abspath(entry.output) for entry in entries]
+        if len(set(outputs)) != len(outputs):
+            raise ValueError("Each instance must have its own output path")
+        self.entries = entries
+        self.num_workers = num_workers or os.cpu_count() or 1
+
+    def run(self, on_result: Optional[Callable[[BatchResult], None]] = None) -> List[BatchResult]:
+        """Giải tất cả bộ dữ liệu, trả về kết quả theo thứ tự của entries
+
+         Args:
+            - on_result: hàm gọi ngay khi 1 bộ dữ liệu được giải xong (theo thứ tự hoàn thành)
+        """
+        results = {}  # type: Dict[int, BatchResult]
+        with ProcessPoolExecutor(max_workers=min(self.num_workers, max(1, len(self.entries)))) as executor:
+            futures = {executor.submit(_solve, entry): i for i, entry in enumerate(self.entries)}
+            for future in as_completed(futures):
+                result = future.result()
+                results[futures[future]] = result
+                if on_result is not None:
+                    on_result(result)
+        return [results[i] for i in range(len(self.entries))]
+
+    @staticmethod
+    def print_summary(results: List[BatchResult]) -> None:
+        x = PrettyTable()
+        x.field_names = ["instance", "fitness", "conflicts", "generations", "stopped", "runtime (s)", "output"]
+        for result in results:
+            if result.error is not None:
+                x.add_row([result.name, "-", "-", "-", "error: " + result.error, round(result.elapsed, 2), "-"])
+            else:
+                x.add_row([result.name, result.fitness, result.num_conflicts, result.generations,
+                           result.stop_reason, round(result.elapsed, 2), result.output])
+        print(x)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Giải nhiều bộ dữ liệu xếp lịch trong 1 lần chạy")
+    parser.add_argument("source", help="thư mục chứa các thư mục dữ liệu con, hoặc file manifest JSON")
+    parser.add_argument("--output-dir", help="ghi kết quả vào <output-dir>/<tên>.json thay vì <thư mục dữ liệu>/results.json")
+    parser.add_argument("--workers", type=int, default=0, help="số tiến trình, 0 để dùng số CPU")
+    parser.add_argument("--summary", metavar="FILE", help="ghi bảng tổng hợp ra FILE dạng JSON")
+    RunConfig.add_arguments(parser)
+    args = parser.parse_args()
+
+    # Tham số chung cho mọi bộ dữ liệu, manifest có thể ghi đè từng trường
+    defaults = RunConfig.from_args(args)
+    if os.path.isdir(args.source):
+        entries = discover(args.source, defaults, args.output_dir)
+    else:
+        entries = read_manifest(args.source, defaults, args.output_dir)
+
+    runner = BatchRunner(entries, args.workers or None)
+    start = time.perf_counter()
+    results = runner.run(lambda result: print("> {} done in {:.2f}s".format(result.name, result.elapsed)))
+    runner.print_summary(results)
+    print("{} instances in {:.2f}s".format(len(results), time.perf_counter() - start))
+    if args.summary:
+        with open(args.summary, "w") as jsonfile:
+            jsonfile.write(json.dumps([result.to_dict() for result in results], indent=4))
@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+from genetic_algorithm import GeneticAlgorithm, Population, RunConfig
+from schedule import ProblemInstance, Schedule, derive_rng
+
+SHIFT_TIMES = ["6h50 - 9h05", "9h25 - 11h50", "12h30 - 14h50", "3h05 - 5h30", "17h45 - 20h00", "20h10 - 21h40"]
+
+
+def generate_instance(data_dir: str, num_courses: int, num_rooms: int, num_lecturers: int,
+                      practice_ratio: float = 0.3, num_shifts: int = 4, max_classes: int = 8,
+                      max_lecturers: int = 2, seed: Optional[int] = None) -> None:
+    """Sinh bộ dữ liệu giả lập theo đúng định dạng của thư mục data/
+
+     Args:
+        - data_dir (str): thư mục ghi courses.json, rooms.json, lecturers.json, shifts.json
+        - num_courses (int): số môn học
+        - num_rooms (int): số phòng học
+        - num_lecturers (int): số giảng viên
+        - practice_ratio (float): tỉ lệ môn thực hành (và phòng thực hành)
+        - num_shifts (int): số ca học mỗi ngày
+        - max_classes (int): số lớp tối đa của 1 môn học
+        - max_lecturers (int): số giảng viên tối đa của 1 môn học
+        - seed (int): hạt giống sinh ngẫu nhiên
+    """
+    validate_size(num_courses, num_rooms, num_lecturers)
+    rng = random.Random(seed)
+    os.makedirs(data_dir, exist_ok=True)
+
+    lecturers = [{"id": "gv{}".format(i), "name": "Giảng viên {}".format(i)} for i in range(num_lecturers)]
+
+    num_practice_rooms = min(num_rooms - 1, max(1, round(num_rooms * practice_ratio)))
+    rooms = []
+    for i in range(num_rooms):
+        prefix = "A" if i < num_practice_rooms else "B"
+        rooms.append({"id": i + 1, "name": "{}{:03d}".format(prefix, i + 1)})
+    rng.shuffle(rooms)
+
+    courses = []
+    for i in range(num_courses):
+        is_practice = rng.random() < practice_ratio
+        courses.append({
+            "id": "{:06d}{}".format(i, "-TH" if is_practice else ""),
+            "name": "{}Môn học {}".format("Thực hành " if is_practice else "", i),
+            "lecturers": rng.sample(lecturers, rng.randint(1, min(max_lecturers, num_lecturers))),
+            "num_classes": rng.randint(1, max_classes),
+            "is_practice": is_practice,
+        })
+
+    shifts = [
+        {"id": i + 1, "time": SHIFT_TIMES[i] if i < len(SHIFT_TIMES) else "Ca {}".format(i + 1)}
+        for i in range(num_shifts)
+    ]
+
+    for filename, data in (("courses.json", courses), ("rooms.json", rooms),
+                           ("lecturers.json", lecturers), ("shifts.json", shifts)):
+        with open(os.path.join(data_dir, filename), "w") as jsonfile:
+            jsonfile.write(json.dumps(data, ensure_ascii=False, indent=4))
+
+
+def benchmark_instance(problem: ProblemInstance, seed: int, num_generations: int,
+                       population_size: int, num_evaluations: int, results_path: str,
+                       selection: str = "tournament", initialization: str = "random") -> Dict:
+    """Đo hiệu năng của các thao tác chính trên 1 bộ dữ liệu
+
+    Mỗi bước dùng 1 luồng số ngẫu nhiên riêng sinh từ `seed` nên quá trình
+    tìm kiếm giống hệt nhau giữa các lần đo. Thời gian tới khi hết xung đột
+    được tính cả thời gian khởi tạo quần thể.
+    """
+    problem.fitness_cache.clear()
+    result = {"seed": seed, "initialization": initialization, "num_classes": problem.num_classes}
+
+    rng = derive_rng(seed, "initialize")
+    start = time.perf_counter()
+    schedules = [Schedule(problem, rng).initialize() for _ in range(num_evaluations)]
+    result["initialize_per_second"] = num_evaluations / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for schedule in schedules:
+        schedule.calculate_fitness()
+    result["evaluations_per_second"] = num_evaluations / (time.perf_counter() - start)
+
+    config = RunConfig(population_size=population_size, num_generations=num_generations,
+                       initialization=initialization, selection=selection, seed=seed)
+    rng = derive_rng(seed, "evolve")
+    start = time.perf_counter()
+    population = Population(size=population_size, problem=problem, rng=rng, initialization=initialization)
+    result["initialize_population_seconds"] = time.perf_counter() - start
+    genetic_algorithm = GeneticAlgorithm(problem, rng=rng, config=config)
+    time_to_zero_conflicts = None
+    generation_to_zero_conflicts = None
+    evolve_start = time.perf_counter()
+    for _ in range(num_generations):
+        population = genetic_algorithm.evolve(population)
+        if time_to_zero_conflicts is None and population.chromosomes[0].get_num_conflicts() == 0:
+            time_to_zero_conflicts = time.perf_counter() - start
+            generation_to_zero_conflicts = genetic_algorithm.generation
+    elapsed = time.perf_counter() - evolve_start
+
+    # Đo bộ nhớ trên 1 lần chạy ngắn riêng vì tracemalloc làm chậm thuật toán
+    tracemalloc.start()
+    rng = derive_rng(seed, "memory")
+    _population = Population(size=population_size, problem=problem, rng=rng, initialization=initialization)
+    _genetic_algorithm = GeneticAlgorithm(problem, rng=rng, config=config)
+    for _ in range(min(num_generations, 3)):
+        _population = _genetic_algorithm.evolve(_population)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = population.chromosomes[0]
+    result.update({
+        "generations": genetic_algorithm.generation,
+        "generations_per_second": genetic_algorithm.generation / elapsed,
+        "time_to_zero_conflicts": time_to_zero_conflicts,
+        "generation_to_zero_conflicts": generation_to_zero_conflicts,
+        "peak_memory_bytes": peak,
+        "best_fitness": best.get_fitness(),
+        "best_num_conflicts": best.get_num_conflicts(),
+    })
+
+    start = time.perf_counter()
+    best.save(results_path)
+    result["save_seconds"] = time.perf_counter() - start
+    return result
+
+
+def validate_size(num_courses: int, num_rooms: int, num_lecturers: int) -> None:
+    """Cần ít nhất 1 phòng thực hành và 1 phòng thường để môn học nào cũng xếp được phòng"""
+    if num_rooms < 2:
+        raise ValueError("num_rooms must be at least 2 (one practice and one regular room)")
+    if num_courses < 1 or num_lecturers < 1:
+        raise ValueError("num_courses and num_lecturers must be positive")
+
+
+def parse_size(size: str) -> Dict:
+    num_courses, num_rooms, num_lecturers = (int(x) for x in size.split("x"))
+    validate_size(num_courses, num_rooms, num_lecturers)
+    return {"num_courses": num_courses, "num_rooms": num_rooms, "num_lecturers": num_lecturers}
+
+
+def run(sizes: List[str], seeds: List[int], num_generations: int, population_size: int,
+        num_evaluations: int, practice_ratio: float, num_shifts: int, selection: str = "tournament",
+        initializations: List[str] = ("random",)) -> Dict:
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "num_generations": num_generations,
+            "population_size": population_size,
+            "selection": selection,
+            "initializations": list(initializations),
+            "practice_ratio": practice_ratio,
+            "num_shifts": num_shifts,
+        },
+        "results": [],
+    }
+    for size in sizes:
+        instance = parse_size(size)
+        for seed in seeds:
+            with tempfile.TemporaryDirectory() as data_dir:
+                generate_instance(data_dir, practice_ratio=practice_ratio, num_shifts=num_shifts,
+                                  seed=seed, **instance)
+                problem = ProblemInstance.read_json(data_dir)
+                for initialization in initializations:
+                    result = benchmark_instance(problem, seed, num_generations, population_size, num_evaluations,
+                                                os.path.join(data_dir, "results.json"), selection, initialization)
+                    result.update(instance, size=size)
+                    report["results"].append(result)
+                    print("{size} seed={seed} {initialization}: {generations_per_second:.2f} generations/s, "
+                          "{evaluations_per_second:.1f} evaluations/s, conflicts={best_num_conflicts}, "
+                          "time to zero conflicts={time_to_zero_conflicts}".format(**result))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark GA engine on synthetic instances")
+    parser.add_argument("--sizes", nargs="+", default=["24x100x30", "100x200x80"],
+                        help="kích thước bộ dữ liệu dạng <môn học>x<phòng>x<giảng viên>")
+    parser.add_argument("--seeds", nargs="+", type=int, default=[0, 1, 2])
+    parser.add_argument("--generations", type=int, default=20)
+    parser.add_argument("--population", type=int, default=10)
+    parser.add_argument("--evaluations", type=int, default=20)
+    parser.add_argument("--selection", choices=RunConfig.SELECTIONS, default="tournament")
+    parser.add_argument("--initializations", nargs="+", choices=Population.INITIALIZATIONS,
+                        default=list(Population.INITIALIZATIONS), help="các cách khởi tạo quần thể cần so sánh")
+    parser.add_argument("--practice-ratio", type=float, default=0.3)
+    parser.add_argument("--shifts", type=int, default=4)
+    parser.add_argument("--generate", metavar="DIR", help="chỉ sinh 1 bộ dữ liệu vào DIR rồi thoát")
+    parser.add_argument("--output", default="benchmark.json")
+    args = parser.parse_args()
+
+    if args.generate:
+        generate_instance(args.generate, practice_ratio=args.practice_ratio, num_shifts=args.shifts,
+                          seed=args.seeds[0], **parse_size(args.sizes[0]))
+    else:
+        report = run(args.sizes, args.seeds, args.generations, args.population,
+                     args.evaluations, args.practice_ratio, args.shifts, args.selection, args.initializations)
+        with open(args.output, "w") as jsonfile:
+            jsonfile.write(json.dumps(report, indent=4))
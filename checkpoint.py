@@ -0,0 +1,262 @@
+import os
+import struct
+import tempfile
+import threading
+import zlib
+from array import array
+from typing import List, Optional
+
+from constraints import ConstraintSet
+from genetic_algorithm import GeneticAlgorithm, Population, RunConfig
+from result_store import file_mode
+from schedule import ProblemInstance, Schedule
+
+
+def fingerprint(problem: ProblemInstance) -> int:
+    """Mã kiểm tra của dữ liệu bài toán, dùng để từ chối checkpoint của bộ dữ liệu khác"""
+    ids = [course.id + ":" + str(course.num_classes) for course in problem.courses]
+    ids += [str(room.id) for room in problem.rooms]
+    ids += [lecturer.id for lecturer in problem.lecturers]
+    ids += [str(shift.id) for shift in problem.shifts]
+    return zlib.crc32("\n".join(ids).encode("utf-8"))
+
+
+def config_fingerprint(config: RunConfig) -> int:
+    """Mã kiểm tra của các tham số tìm kiếm của RunConfig
+
+    Các giới hạn chạy (num_generations, time_budget, ...) và seed không được
+    tính nên có thể tiếp tục checkpoint với giới hạn khác.
+    """
+    fields = [
+        config.population_size, config.mutation_rate, config.num_of_elite, config.cycle_adaptation,
+        config.num_of_candidates, config.initialization, config.local_search_top_k, config.local_search_time,
+        config.selection, config.tournament_size, sorted((config.constraint_weights or {}).items()),
+    ]
+    return zlib.crc32(repr(fields).encode("utf-8"))
+
+
+class Checkpoint:
+    """Bản chụp trạng thái của 1 lần chạy thuật toán di truyền
+
+    File gồm 1 header cố định và phần thân nén zlib chứa trạng thái bộ sinh
+    số ngẫu nhiên, lịch học tốt nhất và gene của từng cá thể ở dạng
+    ProblemInstance.encode.
+
+     Attributes:
+        - generation (int): thế hệ đã chạy xong
+        - fingerprint (int): mã kiểm tra của dữ liệu bài toán
+        - config_fingerprint (int): mã kiểm tra của RunConfig (config_fingerprint)
+        - population (List[bytes]): gene đã mã hoá của từng cá thể, theo thứ tự độ thích nghi
+        - best (bytes): gene đã mã hoá của lịch học tốt nhất từ đầu lần chạy
+        - best_fitness (float): độ thích nghi của lịch học tốt nhất
+        - rng_state (tuple): trạng thái của bộ sinh số ngẫu nhiên (GeneticAlgorithm.rng.getstate())
+        - num_evaluations (int): số lần tính độ thích nghi đã dùng
+        - stagnation (int), termination_fitness (float): trạng thái của Termination
+    """
+    MAGIC = b"GACP"
+    VERSION = 2
+    HEADER = struct.Struct("<4sHIIIIdBdIQId")
+
+    def __init__(self, generation: int, fingerprint: int, population: List[bytes], best: bytes,
+                 best_fitness: float, rng_state: tuple, config_fingerprint: int = 0, num_evaluations: int = 0,
+                 stagnation: int = 0, termination_fitness: float = -1.0) -> None:
+        self.generation = generation
+        self.fingerprint = fingerprint
+        self.config_fingerprint = config_fingerprint
+        self.num_evaluations = num_evaluations
+        self.stagnation = stagnation
+        self.termination_fitness = termination_fitness
+        self.population = population
+        self.best = best
+        self.best_fitness = best_fitness
+        self.rng_state = rng_state
+
+    @classmethod
+    def capture(cls, problem: ProblemInstance, genetic_algorithm: GeneticAlgorithm, population: Population,
+                best: Optional[Schedule] = None) -> "Checkpoint":
+        best = best if best is not None else population.chromosomes[0]
+        return cls(
+            generation=genetic_algorithm.generation,
+            fingerprint=fingerprint(problem),
+            population=[problem.encode(chromosome.genes) for chromosome in population.chromosomes],
+            best=problem.encode(best.genes),
+            best_fitness=best.get_fitness(),
+            rng_state=genetic_algorithm.rng.getstate(),
+            config_fingerprint=config_fingerprint(genetic_algorithm.config),
+            num_evaluations=genetic_algorithm.num_evaluations,
+            stagnation=genetic_algorithm.termination.stagnation,
+            termination_fitness=genetic_algorithm.termination.best_fitness,
+        )
+
+    def restore(self, problem: ProblemInstance, genetic_algorithm: GeneticAlgorithm) -> Population:
+        """Khôi phục quần thể, thế hệ, bộ sinh số ngẫu nhiên và trạng thái của các điều kiện dừng
+
+        Số lần tính độ thích nghi và số thế hệ không cải thiện được tính tiếp
+        từ checkpoint nên max_evaluations, max_stagnation áp dụng cho cả lần chạy.
+
+         Returns:
+            - Population: quần thể đã tính lại độ thích nghi
+        """
+        if self.fingerprint != fingerprint(problem):
+            raise ValueError("Checkpoint does not match the problem instance")
+        if self.config_fingerprint != config_fingerprint(genetic_algorithm.config):
+            raise ValueError("Checkpoint was written with a different RunConfig")
+        population = Population(0, problem, genetic_algorithm.rng, constraints=genetic_algorithm.constraints)
+        for encoded in self.population:
+            chromosome = Schedule(problem, genetic_algorithm.rng, genetic_algorithm.constraints)
+            chromosome.genes.extend(problem.decode(encoded))
+            chromosome.calculate_fitness()
+            population.chromosomes.append(chromosome)
+        population.size = len(population.chromosomes)
+        genetic_algorithm.generation = self.generation
+        genetic_algorithm.rng.setstate(self.rng_state)
+        genetic_algorithm.num_evaluations = self.num_evaluations
+        genetic_algorithm.termination.resume(self.termination_fitness, self.stagnation)
+        return population
+
+    def best_schedule(self, problem: ProblemInstance, constraints: Optional[ConstraintSet] = None) -> Schedule:
+        schedule = Schedule(problem, constraints=constraints)
+        schedule.genes.extend(problem.decode(self.best))
+        schedule.calculate_fitness()
+        return schedule
+
+    def to_bytes(self) -> bytes:
+        version, internal, gauss_next = self.rng_state
+        body = array("I", internal).tobytes() + self.best + b"".join(self.population)
+        header = self.HEADER.pack(
+            self.MAGIC, self.VERSION, self.generation, self.fingerprint, len(self.population),
+            len(self.best), self.best_fitness, gauss_next is not None, gauss_next or 0.0,
+            self.config_fingerprint, self.num_evaluations, self.stagnation, self.termination_fitness,
+        )
+        return header + zlib.compress(body)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Checkpoint":
+        if len(data) < 6 or data[:4] != cls.MAGIC:
+            raise ValueError("Not a checkpoint file")
+        if struct.unpack_from("<H", data, 4)[0] != cls.VERSION:
+            raise ValueError("Unsupported checkpoint version")
+        magic, version, generation, _fingerprint, size, length, best_fitness, has_gauss, gauss_next, \
+            _config_fingerprint, num_evaluations, stagnation, termination_fitness = cls.HEADER.unpack_from(data)
+        body = zlib.decompress(data[cls.HEADER.size:])
+        internal = array("I")
+        internal.frombytes(body[:len(body) - length * (size + 1)])
+        genes = body[len(body) - length * (size + 1):]
+        return cls(
+            generation=generation,
+            fingerprint=_fingerprint,
+            population=[genes[length * (i + 1):length * (i + 2)] for i in range(size)],
+            best=genes[:length],
+            best_fitness=best_fitness,
+            rng_state=(3, tuple(internal), gauss_next if has_gauss else None),
+            config_fingerprint=_config_fingerprint,
+            num_evaluations=num_evaluations,
+            stagnation=stagnation,
+            termination_fitness=termination_fitness,
+        )
+
+    def write(self, filepath: str) -> None:
+        """Ghi checkpoint ra file tạm rồi đổi tên để không bao giờ để lại file hỏng"""
+        directory = os.path.dirname(os.path.abspath(filepath))
+        fd, tmp_path = tempfile.mkstemp(prefix=".checkpoint-", dir=directory)
+        try:
+            os.fchmod(fd, file_mode(filepath))
+            with os.fdopen(fd, "wb") as file:
+                file.write(self.to_bytes())
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def read(cls, filepath: str) -> "Checkpoint":
+        with open(filepath, "rb") as file:
+            return cls.from_bytes(file.read())
+
+    @classmethod
+    def latest(cls, filepath: str) -> Optional["Checkpoint"]:
+        """Đọc checkpoint mới nhất, trả về None nếu chưa có file"""
+        if not os.path.exists(filepath):
+            return None
+        return cls.read(filepath)
+
+
+class Checkpointer:
+    """Ghi checkpoint định kỳ trên 1 luồng nền
+
+    Trạng thái được chụp ngay trong vòng lặp (chỉ mã hoá gene), việc nén và
+    ghi file chạy trên luồng nền. Nếu bản trước chưa ghi xong thì chỉ bản mới
+    nhất được ghi.
+
+     Attributes:
+        - filepath (str): đường dẫn file checkpoint
+        - interval (int): số thế hệ giữa 2 lần ghi
+        - constraints (ConstraintSet): ràng buộc dùng để tính lại lịch học tốt nhất của checkpoint
+        - writes (int): số lần đã ghi file
+        - error (Exception): lỗi của lần ghi gần nhất nếu có
+    """
+
+    def __init__(self, filepath: str, problem: ProblemInstance, interval: int = 10,
+                 checkpoint: Optional[Checkpoint] = None, constraints: Optional[ConstraintSet] = None) -> None:
+        self.filepath = filepath
+        self.problem = problem
+        self.interval = max(1, interval)
+        self.writes = 0
+        self.error = None  # type: Optional[Exception]
+        self.__best = checkpoint.best_schedule(problem, constraints) if checkpoint is not None else None
+        self.__pending = None  # type: Optional[Checkpoint]
+        self.__closed = False
+        self.__lock = threading.Lock()
+        self.__ready = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, name="checkpointer", daemon=True)
+        self.__thread.start()
+
+    @property
+    def best(self) -> Optional[Schedule]:
+        return self.__best
+
+    def step(self, genetic_algorithm: GeneticAlgorithm, population: Population, force: bool = False) -> None:
+        """Gọi sau mỗi lần evolve, chụp trạng thái sau mỗi `interval` thế hệ"""
+        best = population.chromosomes[0]
+        if self.__best is None or best.get_fitness() > self.__best.get_fitness():
+            self.__best = best.copy()
+            self.__best.calculate_fitness()
+        if not force and genetic_algorithm.generation % self.interval != 0:
+            return
+        checkpoint = Checkpoint.capture(self.problem, genetic_algorithm, population, self.__best)
+        with self.__lock:
+            self.__pending = checkpoint
+            self.__ready.set()
+
+    def close(self) -> None:
+        """Chờ luồng nền ghi xong bản cuối cùng"""
+        with self.__lock:
+            self.__closed = True
+            self.__ready.set()
+        self.__thread.join()
+
+    def __run(self) -> None:
+        while True:
+            self.__ready.wait()
+            with self.__lock:
+                checkpoint, self.__pending = self.__pending, None
+                closed = self.__closed
+                self.__ready.clear()
+            if checkpoint is not None:
+                try:
+                    checkpoint.write(self.filepath)
+                    self.writes += 1
+                except Exception as e:
+                    self.error = e
+            if closed:
+                return
+
+    def __enter__(self) -> "Checkpointer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
@@ -0,0 +1,255 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Hashable, List, Mapping, Optional, Tuple, Type, Union
+
+from schedule import Lecturer, ProblemInstance
+
+CONSTRAINTS = []  # type: List[Type["Constraint"]]
+
+
+def register(constraint: Type["Constraint"]) -> Type["Constraint"]:
+    """Decorator thêm 1 loại ràng buộc vào danh sách được biên dịch cho mọi ProblemInstance"""
+    CONSTRAINTS.append(constraint)
+    return constraint
+
+
+def parse_weights(value: Union[str, Mapping[str, Any]]) -> Dict[str, float]:
+    """Đọc trọng số dạng dict hoặc chuỗi "tên=trọng số,tên=trọng số" """
+    if isinstance(value, Mapping):
+        items = list(value.items())
+    else:
+        items = []
+        for item in str(value).split(","):
+            if not item.strip():
+                continue
+            name, separator, weight = item.partition("=")
+            if not separator or not name.strip():
+                raise ValueError("constraint weight must be written as name=weight: {}".format(item))
+            items.append((name, weight))
+    return {str(name).strip(): float(weight) for name, weight in items}
+
+
+class Constraint(ABC):
+    """Ràng buộc mềm của bài toán xếp lịch
+
+    Dữ liệu cần thiết được biên dịch thành bảng tra cứu 1 lần trong __init__,
+    sau đó ràng buộc chỉ làm việc với vị trí lớp và khoá (ngày, ca, phòng,
+    giảng viên) của Class.key. Ràng buộc không được giữ tham chiếu tới
+    ProblemInstance để có thể gửi sang tiến trình con.
+
+     Attributes:
+        - name (str): tên dùng trong trọng số
+        - weight (float): trọng số mặc định
+        - active (bool): False nếu dữ liệu không có thông tin cho ràng buộc này (không cần tính)
+        - key: khoá của dữ liệu riêng của ràng buộc ngoài ProblemInstance (vd: lịch học gốc),
+          được đưa vào ConstraintSet.key, None nếu không có
+    """
+    name = None  # type: str
+    weight = 0.0
+    key = None  # type: Optional[Hashable]
+
+    def __init__(self, problem: ProblemInstance) -> None:
+        self.active = True
+
+
+class UnaryConstraint(Constraint):
+    """Ràng buộc trên từng lớp, điểm phạt chỉ phụ thuộc vào cách xếp của lớp đó"""
+
+    @abstractmethod
+    def penalty(self, i: int, key: Tuple[int, int, int, int]) -> int:
+        pass
+
+
+class GroupConstraint(Constraint):
+    """Ràng buộc trên số lớp của từng nhóm (vd: giảng viên, giảng viên trong 1 ngày)"""
+
+    @abstractmethod
+    def group(self, i: int, key: Tuple[int, int, int, int]) -> Optional[Hashable]:
+        """Nhóm của lớp thứ i, None nếu lớp không thuộc nhóm nào"""
+        pass
+
+    @abstractmethod
+    def loss(self, group: Hashable, count: int) -> int:
+        """Điểm phạt của nhóm có `count` lớp"""
+        pass
+
+
+@register
+class LecturerLoad(GroupConstraint):
+    """Số lớp của mỗi giảng viên phải nằm trong [Lecturer.minimum, Lecturer.maximum]"""
+    name = "lecturer_load"
+    weight = 0.01
+
+    def __init__(self, problem: ProblemInstance) -> None:
+        super().__init__(problem)
+        self.minimum = Lecturer.minimum
+        self.maximum = Lecturer.maximum
+
+    def group(self, i: int, key: Tuple[int, int, int, int]) -> Optional[Hashable]:
+        return key[3]
+
+    def loss(self, group: Hashable, count: int) -> int:
+        if count == 0:
+            return 0
+        if count > self.maximum:
+            return count - self.maximum
+        if count < self.minimum:
+            return self.minimum - count
+        return 0
+
+
+@register
+class LecturerAvailability(UnaryConstraint):
+    """Giảng viên không dạy vào các (ngày, ca) bận (Lecturer.unavailable)"""
+    name = "availability"
+    weight = 0.1
+
+    def __init__(self, problem: ProblemInstance) -> None:
+        super().__init__(problem)
+        shifts = {shift.id: shift.index for shift in problem.shifts}
+        self.unavailable = frozenset(
+            (day, shifts[shift], lecturer.index)
+            for lecturer in problem.lecturers for day, shift in lecturer.unavailable if shift in shifts
+        )
+        self.active = bool(self.unavailable)
+
+    def penalty(self, i: int, key: Tuple[int, int, int, int]) -> int:
+        return (key[0], key[1], key[3]) in self.unavailable
+
+
+@register
+class RoomCapacity(UnaryConstraint):
+    """Số sinh viên của lớp (Course.num_students) không vượt quá sức chứa của phòng (Room.capacity)"""
+    name = "room_capacity"
+    weight = 0.1
+
+    def __init__(self, problem: ProblemInstance) -> None:
+        super().__init__(problem)
+        self.capacities = {room.index: room.capacity for room in problem.rooms if room.capacity is not None}
+        self.num_students = [course.num_students or 0 for course in problem.class_courses]
+        self.active = bool(self.capacities) and any(self.num_students)
+
+    def penalty(self, i: int, key: Tuple[int, int, int, int]) -> int:
+        capacity = self.capacities.get(key[2])
+        return capacity is not None and self.num_students[i] > capacity
+
+
+@register
+class PracticeRoom(UnaryConstraint):
+    """Lớp thực hành phải học ở phòng thực hành và ngược lại
+
+    ProblemInstance.sample_class luôn chọn phòng đúng loại, ràng buộc này bắt
+    các lịch học không do thuật toán sinh ra (vd: đọc từ file kết quả).
+    """
+    name = "practice_room"
+    weight = 0.1
+
+    def __init__(self, problem: ProblemInstance) -> None:
+        super().__init__(problem)
+        self.practice_rooms = frozenset(room.index for room in problem.rooms_practice)
+        self.is_practice = [course.is_practice for course in problem.class_courses]
+
+    def penalty(self, i: int, key: Tuple[int, int, int, int]) -> int:
+        return (key[2] in self.practice_rooms) != self.is_practice[i]
+
+
+@register
+class MaxClassesPerDay(GroupConstraint):
+    """Số lớp của giảng viên trong 1 ngày không vượt quá Lecturer.max_classes_per_day"""
+    name = "max_classes_per_day"
+    weight = 0.05
+
+    def __init__(self, problem: ProblemInstance) -> None:
+        super().__init__(problem)
+        self.limits = {
+            lecturer.index: lecturer.max_classes_per_day
+            for lecturer in problem.lecturers if lecturer.max_classes_per_day is not None
+        }
+        self.active = bool(self.limits)
+
+    def group(self, i: int, key: Tuple[int, int, int, int]) -> Optional[Hashable]:
+        return (key[3], key[0]) if key[3] in self.limits else None
+
+    def loss(self, group: Hashable, count: int) -> int:
+        return max(0, count - self.limits[group[0]])
+
+
+class Stability(UnaryConstraint):
+    """Phạt mỗi lớp có cách xếp khác với lớp tương ứng trong lịch học gốc
+
+    Không được đăng ký trong CONSTRAINTS vì phụ thuộc vào lịch học gốc, dùng
+    khi xếp lại lịch học sau khi dữ liệu thay đổi (warm_start.WarmStart).
+
+     Attributes:
+        - baseline: Class.key() cũ của từng lớp, None nếu là lớp mới
+    """
+    name = "changes"
+    weight = 0.01
+
+    def __init__(self, problem: ProblemInstance, baseline: List[Optional[Tuple[int, int, int, int]]]) -> None:
+        super().__init__(problem)
+        self.baseline = list(baseline)
+        # repr chính xác (không đụng độ như hash) và chuỗi giữ sẵn giá trị băm
+        self.key = (self.name, repr(self.baseline))
+
+    def penalty(self, i: int, key: Tuple[int, int, int, int]) -> int:
+        baseline = self.baseline[i]
+        return baseline is not None and key != baseline
+
+
+class ConstraintSet:
+    """Các ràng buộc đã biên dịch của 1 ProblemInstance cùng trọng số của 1 lần chạy
+
+    Độ thích nghi = 1 / (trọng số "conflicts" * số xung đột + tổng trọng số *
+    điểm phạt của từng ràng buộc + 1). Ràng buộc không có dữ liệu hoặc có
+    trọng số 0 bị bỏ qua khi tính. Các bản `weighted` dùng chung bảng tra cứu
+    đã biên dịch.
+
+     Attributes:
+        - constraints (List[Constraint]): tất cả các ràng buộc đã biên dịch
+        - weights (Dict[str, float]): trọng số theo tên, gồm cả "conflicts"
+        - unary, grouped: các ràng buộc cần tính cùng trọng số của chúng
+        - key (tuple): khoá của bộ trọng số (và Constraint.key nếu có), dùng trong FitnessCache
+    """
+    CONFLICTS = "conflicts"
+    CONFLICTS_WEIGHT = 0.1
+
+    def __init__(self, constraints: List[Constraint], weights: Optional[Mapping[str, float]] = None) -> None:
+        self.constraints = constraints
+        self.weights = {self.CONFLICTS: self.CONFLICTS_WEIGHT}
+        self.weights.update((constraint.name, constraint.weight) for constraint in constraints)
+        for name, weight in (weights or {}).items():
+            if name not in self.weights:
+                raise ValueError("Unknown constraint: {}".format(name))
+            if weight < 0:
+                raise ValueError("Constraint weight must not be negative: {}".format(name))
+            self.weights[name] = float(weight)
+        self.conflicts_weight = self.weights[self.CONFLICTS]
+        terms = [
+            (constraint, self.weights[constraint.name]) for constraint in constraints
+            if constraint.active and self.weights[constraint.name] > 0
+        ]
+        self.unary = [term for term in terms if isinstance(term[0], UnaryConstraint)]
+        self.grouped = [term for term in terms if isinstance(term[0], GroupConstraint)]
+        self.key = tuple(sorted(self.weights.items())) \
+            + tuple(constraint.key for constraint in constraints if constraint.key is not None)
+
+    @classmethod
+    def compile(cls, problem: ProblemInstance, constraint_types: Optional[List[Type[Constraint]]] = None) -> "ConstraintSet":
+        """Biên dịch các ràng buộc (mặc định CONSTRAINTS) cho bộ dữ liệu"""
+        return cls([constraint_type(problem) for constraint_type in (constraint_types or CONSTRAINTS)])
+
+    @staticmethod
+    def names() -> List[str]:
+        return [ConstraintSet.CONFLICTS] + [constraint_type.name for constraint_type in CONSTRAINTS]
+
+    def weighted(self, weights: Optional[Mapping[str, float]]) -> "ConstraintSet":
+        """Bộ ràng buộc với trọng số của 1 lần chạy, trả về chính nó nếu không đổi trọng số"""
+        if not weights:
+            return self
+        return ConstraintSet(self.constraints, dict(self.weights, **weights))
+
+    def fitness(self, num_conflicts: int, penalties: List[int]) -> float:
+        cost = num_conflicts * self.conflicts_weight
+        for (_, weight), penalty in zip(self.unary + self.grouped, penalties):
+            cost += penalty * weight
+        return 1 / (cost + 1)
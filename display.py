@@ -1,20 +1,27 @@
+import argparse
+from contextlib import nullcontext
 from typing import List
 
 from prettytable import PrettyTable
 
-from genetic_algorithm import GeneticAlgorithm, Population
-from schedule import Schedule, Shift, Room, Lecturer, Class, Course
+from checkpoint import Checkpoint, Checkpointer
+from constraints import Stability
+from evaluator import ProcessPoolEvaluator, SerialEvaluator
+from genetic_algorithm import GeneticAlgorithm, Population, RunConfig
+from profiling import metrics
+from schedule import Schedule, Shift, Room, Lecturer, Class, Course, ProblemInstance, derive_rng
+from warm_start import WarmStart
 
 
 class Display:
     i = 0
 
-    def print_available_data(self) -> None:
+    def print_available_data(self, problem: ProblemInstance) -> None:
         print("> All available data")
-        self.print_courses(Course.load())
-        self.print_lecturers(Lecturer.load())
-        self.print_rooms(Room.load())
-        self.print_shifts(Shift.load())
+        self.print_courses(problem.courses)
+        self.print_lecturers(problem.lecturers)
+        self.print_rooms(problem.rooms)
+        self.print_shifts(problem.shifts)
 
     def print_courses(self, courses: List[Course]) -> None:
         x = PrettyTable()
@@ -73,21 +80,100 @@ class Display:
             ])
         print(x)
 
+    def print_metrics(self, report: dict) -> None:
+        x = PrettyTable()
+        x.field_names = ["step", "calls", "total (s)", "mean (ms)"]
+        for name, timer in sorted(report["timers"].items(), key=lambda x: -x[1]["total"]):
+            x.add_row([name, timer["calls"], round(timer["total"], 4), round(timer["mean"] * 1000, 4)])
+        print(x)
+        x = PrettyTable()
+        x.field_names = ["counter", "value"]
+        for name, value in sorted(report["counters"].items()):
+            x.add_row([name, value])
+        print(x)
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=0,
+                        help="số tiến trình tính độ thích nghi (0: tính tuần tự)")
+    parser.add_argument("--metrics", action="store_true",
+                        help="đo thời gian và đếm số lần gọi các bước của thuật toán")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="chạy cProfile và ghi kết quả pstats vào FILE")
+    parser.add_argument("--checkpoint", metavar="FILE",
+                        help="ghi checkpoint của quần thể vào FILE trong khi chạy")
+    parser.add_argument("--checkpoint-interval", type=int, default=10,
+                        help="số thế hệ giữa 2 lần ghi checkpoint")
+    parser.add_argument("--resume", action="store_true",
+                        help="tiếp tục từ checkpoint mới nhất trong FILE nếu có")
+    parser.add_argument("--warm-start", action="store_true",
+                        help="xếp lại từ data/results.json, chỉ đổi các lớp bị ảnh hưởng bởi thay đổi của dữ liệu "
+                             "(--target-conflicts mặc định 0)")
+    parser.add_argument("--stability-weight", type=float, default=Stability.weight,
+                        help="trọng số phạt mỗi lớp khác lịch học cũ khi dùng --warm-start")
+    RunConfig.add_arguments(parser)
+    args = parser.parse_args()
+    if args.metrics:
+        metrics.enable()
+    config = RunConfig.from_args(args)
+
+    problem = ProblemInstance.load()
     display = Display()
-    display.print_available_data()
+    display.print_available_data(problem)
+
+    evaluator = ProcessPoolEvaluator(problem, args.workers) if args.workers > 0 else SerialEvaluator()
+    rng = derive_rng(config.seed)
+    warm_start = WarmStart(problem, Schedule.load(registry=problem.registry), config, args.stability_weight, rng) if args.warm_start else None
+    if warm_start is not None:
+        genetic_algorithm = warm_start.genetic_algorithm(evaluator)
+    else:
+        genetic_algorithm = GeneticAlgorithm(problem, evaluator, rng, config)
+    checkpoint = Checkpoint.latest(args.checkpoint) if args.checkpoint and args.resume else None
+    if checkpoint is not None:
+        population = checkpoint.restore(problem, genetic_algorithm)
+        display.i = genetic_algorithm.generation
+        print("> Resumed from generation {}".format(genetic_algorithm.generation))
+    elif warm_start is not None:
+        # warm_start.solve() tạo quần thể từ lịch học đã sửa
+        population = None
+        print("> Warm start: {} of {} classes reassigned ({} new)".format(
+            len(warm_start.affected), problem.num_classes, warm_start.num_new))
+    else:
+        population = Population(size=config.population_size, problem=problem, rng=rng,
+                                initialization=config.initialization, constraints=genetic_algorithm.constraints)
+        population.chromosomes.sort(key=lambda x: x.get_fitness(), reverse=True)
+    if population is not None:
+        display.print_chromosomes(population.chromosomes)
 
-    population = Population(size=10)
-    population.chromosomes.sort(key=lambda x: x.get_fitness(), reverse=True)
-    display.print_chromosomes(population.chromosomes)
+    checkpointer = Checkpointer(args.checkpoint, problem, args.checkpoint_interval, checkpoint,
+                                genetic_algorithm.constraints) if args.checkpoint else None
 
-    genetic_algorithm = GeneticAlgorithm()
-    for i in range(50):
-        population = genetic_algorithm.evolve(population)
+    def on_generation(population: Population) -> bool:
         display.print_chromosomes(population.chromosomes)
-        if population.chromosomes[0].get_fitness() == 1.0:
-            break
-
-    population.chromosomes[0].save()
+        if checkpointer is not None:
+            checkpointer.step(genetic_algorithm, population)
+        return False
+
+    with evaluator, checkpointer or nullcontext(), \
+            metrics.profile(args.profile, limit=20) if args.profile else nullcontext():
+        if warm_start is not None:
+            population = warm_start.solve(genetic_algorithm, population, on_generation)
+            stop_reason = warm_start.stop_reason
+        else:
+            population = genetic_algorithm.run(population, on_generation)
+            stop_reason = genetic_algorithm.stop_reason
+        print("> Stopped after generation {} ({}), {} evaluations".format(
+            genetic_algorithm.generation, stop_reason, genetic_algorithm.num_evaluations))
+        print("> Fitness cache: {hits} hits, {misses} misses ({hit_rate:.1%})".format(**problem.fitness_cache.stats()))
+        print("> Penalties: {}".format(", ".join(
+            "{}={}".format(name, penalty) for name, penalty in population.chromosomes[0].penalties().items())))
+        if warm_start is not None:
+            print("> Changed classes: {}".format(warm_start.num_changes(population.chromosomes[0])))
+        if checkpointer is not None:
+            checkpointer.step(genetic_algorithm, population, force=True)
+
+        population.chromosomes[0].save()
     display.print_classes(population.chromosomes[0].classes)
+    if args.metrics:
+        display.print_metrics(metrics.report())
@@ -0,0 +1,109 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from constraints import ConstraintSet
+from profiling import metrics
+from schedule import ConflictIndex, ProblemInstance, Schedule
+
+
+class SerialEvaluator:
+    """Tính độ thích nghi lần lượt trong tiến trình hiện tại"""
+
+    def evaluate(self, chromosomes: List[Schedule]) -> None:
+        for chromosome in chromosomes:
+            chromosome.calculate_fitness()
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "SerialEvaluator":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+_worker = {}  # type: Dict[str, object]
+
+
+def _initialize_worker(constraints: ConstraintSet) -> None:
+    _worker["base"] = constraints
+    _worker["constraints"] = {constraints.key: constraints}
+
+
+def _evaluate_encoded(task: Tuple[bytes, tuple]) -> Tuple[int, float, bytes]:
+    encoded, weights = task
+    constraint_sets = _worker["constraints"]
+    constraints = constraint_sets.get(weights)
+    if constraints is None:
+        constraints = _worker["base"].weighted(dict(weights))
+        constraint_sets[weights] = constraints
+    conflict_index = ConflictIndex(ProblemInstance.decode_keys(encoded), constraints)
+    return conflict_index.num_conflicts, conflict_index.fitness(), bytes(conflict_index.flags)
+
+
+class ProcessPoolEvaluator:
+    """Tính độ thích nghi song song trên nhiều tiến trình
+
+    Mỗi lịch học được gửi sang tiến trình con dưới dạng mã hoá gọn của
+    ProblemInstance.encode thay vì cả đồ thị đối tượng Class, kèm trọng số
+    các ràng buộc của lịch học. Bảng tra cứu của các ràng buộc chỉ được gửi 1
+    lần khi khởi động tiến trình con. Lịch học đã có trong
+    problem.fitness_cache không được gửi đi. Lịch học dùng ràng buộc không có
+    trong problem.constraints (vd: Stability) được tính ngay trong tiến trình
+    hiện tại. Kết quả giống hệt SerialEvaluator.
+
+     Attributes:
+        - problem: Dữ liệu bài toán
+        - num_workers: Số tiến trình, mặc định bằng số CPU
+    """
+
+    def __init__(self, problem: ProblemInstance, num_workers: Optional[int] = None) -> None:
+        self.problem = problem
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.__executor = ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            initializer=_initialize_worker,
+            initargs=(problem.constraints,),
+        )
+
+    @metrics.timed("parallel_evaluate")
+    def evaluate(self, chromosomes: List[Schedule]) -> None:
+        if metrics.enabled: metrics.count("parallel_fitness_evaluations", len(chromosomes))
+        cache = self.problem.fitness_cache
+        pending = {}  # type: Dict[Tuple[tuple, bytes], List[Schedule]]
+        for chromosome in chromosomes:
+            if chromosome.constraints.constraints is not self.problem.constraints.constraints:
+                chromosome.calculate_fitness()
+                continue
+            key = chromosome.fitness_key()
+            cached = cache.get(key) if cache.enabled else None
+            if cached is not None:
+                self.__set_fitness(chromosome, cached)
+            else:
+                pending.setdefault(key, []).append(chromosome)
+        if not pending:
+            return
+        chunksize = max(1, len(pending) // (4 * self.num_workers))
+        tasks = ((encoded, weights) for weights, encoded in pending)
+        results = self.__executor.map(_evaluate_encoded, tasks, chunksize=chunksize)
+        for (key, _chromosomes), result in zip(pending.items(), results):
+            if cache.enabled:
+                cache.put(key, result)
+            for chromosome in _chromosomes:
+                self.__set_fitness(chromosome, result)
+
+    @staticmethod
+    def __set_fitness(chromosome: Schedule, result: Tuple[int, float, bytes]) -> None:
+        num_conflicts, fitness, flags = result
+        chromosome.set_fitness(num_conflicts, fitness, [bool(flag) for flag in flags])
+
+    def close(self) -> None:
+        self.__executor.shutdown()
+
+    def __enter__(self) -> "ProcessPoolEvaluator":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -1,80 +1,460 @@
+import argparse
 import random
+import time
 from abc import ABC
-from typing import List
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
 
-from schedule import Schedule
+from constraints import ConstraintSet, parse_weights
+from evaluator import SerialEvaluator
+from local_search import LocalSearch
+from profiling import metrics
+from schedule import ProblemInstance, Schedule
 
 
 class Population(ABC):
-    def __init__(self, size: int):
+    INITIALIZATIONS = ("random", "greedy")
+
+    def __init__(self, size: int, problem: Optional[ProblemInstance] = None, rng: Optional[random.Random] = None,
+                 initialization: str = "random", constraints: Optional[ConstraintSet] = None):
+        if initialization not in self.INITIALIZATIONS:
+            raise ValueError("initialization must be one of {}".format(", ".join(self.INITIALIZATIONS)))
         self.size = size
-        self.chromosomes = [Schedule().initialize() for _ in range(size)]
+        self.problem = problem if problem is not None else ProblemInstance.load()
+        self.rng = rng if rng is not None else random
+        if initialization == "greedy":
+            self.chromosomes = [Schedule(self.problem, self.rng, constraints).initialize_greedy() for _ in range(size)]
+        else:
+            self.chromosomes = [Schedule(self.problem, self.rng, constraints).initialize() for _ in range(size)]
+
+
+class RunConfig:
+    """Tham số của 1 lần chạy thuật toán di truyền
+
+     Attributes:
+        - population_size (int): Số cá thể của quần thể
+        - num_generations (int): Số thế hệ tối đa
+        - time_budget (float): Thời gian chạy tối đa (giây), None nếu không giới hạn
+        - max_evaluations (int): Số lần tính độ thích nghi tối đa, None nếu không giới hạn
+        - max_stagnation (int): Dừng khi độ thích nghi tốt nhất không tăng sau ngần ấy thế hệ
+        - target_conflicts (int): Dừng khi cá thể tốt nhất có không quá ngần ấy xung đột
+        - mutation_rate (float): Xác suất đột biến của mỗi gene
+        - num_of_elite (int): Số cá thể ưu tú được giữ nguyên qua mỗi thế hệ
+        - cycle_adaptation (int): Số thế hệ giữa 2 lần chạy giai đoạn thích nghi
+        - num_of_candidates (int): Số cách xếp được thử cho mỗi lớp bị xung đột
+        - initialization (str): Cách khởi tạo quần thể: "random" hoặc "greedy" (Schedule.initialize_greedy)
+        - local_search_top_k (int): Số cá thể tốt nhất được tìm kiếm cục bộ sau mỗi thế hệ, 0 để tắt
+        - local_search_time (float): Thời gian tìm kiếm cục bộ tối đa mỗi thế hệ (giây)
+        - selection (str): Cách chọn cha mẹ: "tournament", "roulette" hoặc "best" (2 cá thể tốt nhất)
+        - tournament_size (int): Số cá thể mỗi vòng đấu khi selection là "tournament"
+        - constraint_weights (Dict[str, float]): Trọng số của các ràng buộc theo tên (xem
+          constraints.ConstraintSet), None để dùng trọng số mặc định
+        - seed (int): Hạt giống, None nếu lấy từ hệ điều hành
+    """
+    SELECTIONS = ("tournament", "roulette", "best")
+    FIELDS = {
+        "population_size": int,
+        "num_generations": int,
+        "time_budget": float,
+        "max_evaluations": int,
+        "max_stagnation": int,
+        "target_conflicts": int,
+        "mutation_rate": float,
+        "num_of_elite": int,
+        "cycle_adaptation": int,
+        "num_of_candidates": int,
+        "initialization": str,
+        "local_search_top_k": int,
+        "local_search_time": float,
+        "selection": str,
+        "tournament_size": int,
+        "constraint_weights": parse_weights,
+        "seed": int,
+    }
+    # Tham số dòng lệnh của mỗi trường là --<tên trường>, thêm tên ngắn đã dùng từ trước
+    FLAG_ALIASES = {"population_size": "--population", "num_generations": "--generations", "num_of_elite": "--elite"}
+    HELP = {
+        "population_size": "số cá thể của quần thể",
+        "num_generations": "số thế hệ tối đa",
+        "time_budget": "thời gian chạy tối đa (giây)",
+        "max_evaluations": "số lần tính độ thích nghi tối đa",
+        "max_stagnation": "dừng khi không cải thiện sau ngần ấy thế hệ",
+        "target_conflicts": "dừng khi số xung đột không quá giá trị này",
+        "mutation_rate": "xác suất đột biến của mỗi gene",
+        "num_of_elite": "số cá thể ưu tú giữ lại mỗi thế hệ",
+        "cycle_adaptation": "số thế hệ giữa 2 lần chạy giai đoạn thích nghi",
+        "num_of_candidates": "số cách xếp được thử cho mỗi lớp bị xung đột",
+        "initialization": "cách khởi tạo quần thể",
+        "local_search_top_k": "số cá thể tốt nhất được tìm kiếm cục bộ sau mỗi thế hệ",
+        "local_search_time": "thời gian tìm kiếm cục bộ mỗi thế hệ (giây)",
+        "selection": "cách chọn cha mẹ khi lai ghép",
+        "tournament_size": "số cá thể mỗi vòng đấu khi --selection là tournament",
+        "constraint_weights": "trọng số của các ràng buộc, vd: conflicts=0.1,availability=0.5",
+        "seed": "hạt giống để chạy lại đúng quá trình tìm kiếm",
+    }
+
+    def __init__(self, population_size: int = 10, num_generations: int = 50, time_budget: Optional[float] = None,
+                 max_evaluations: Optional[int] = None, max_stagnation: Optional[int] = None,
+                 target_conflicts: Optional[int] = None, mutation_rate: float = 0.1, num_of_elite: int = 2, cycle_adaptation: int = 5,
+                 num_of_candidates: int = 4, initialization: str = "random", local_search_top_k: int = 0,
+                 local_search_time: float = 0.05, selection: str = "tournament", tournament_size: int = 3,
+                 constraint_weights: Optional[Dict[str, float]] = None, seed: Optional[int] = None) -> None:
+        self.population_size = population_size
+        self.num_generations = num_generations
+        self.time_budget = time_budget
+        self.max_evaluations = max_evaluations
+        self.max_stagnation = max_stagnation
+        self.target_conflicts = target_conflicts
+        self.mutation_rate = mutation_rate
+        self.num_of_elite = num_of_elite
+        self.cycle_adaptation = cycle_adaptation
+        self.num_of_candidates = num_of_candidates
+        self.initialization = initialization
+        self.local_search_top_k = local_search_top_k
+        self.local_search_time = local_search_time
+        self.selection = selection
+        self.tournament_size = tournament_size
+        self.constraint_weights = constraint_weights
+        self.seed = seed
+        self.validate()
+
+    def validate(self) -> None:
+        if self.population_size < 2:
+            raise ValueError("population_size must be at least 2")
+        if not 0 <= self.num_of_elite < self.population_size:
+            raise ValueError("num_of_elite must be between 0 and population_size - 1")
+        if self.num_generations < 0:
+            raise ValueError("num_generations must not be negative")
+        if self.time_budget is not None and self.time_budget <= 0:
+            raise ValueError("time_budget must be positive")
+        if self.max_evaluations is not None and self.max_evaluations < 1:
+            raise ValueError("max_evaluations must be positive")
+        if self.max_stagnation is not None and self.max_stagnation < 1:
+            raise ValueError("max_stagnation must be positive")
+        if self.target_conflicts is not None and self.target_conflicts < 0:
+            raise ValueError("target_conflicts must not be negative")
+        if not 0 <= self.mutation_rate <= 1:
+            raise ValueError("mutation_rate must be between 0 and 1")
+        if self.cycle_adaptation < 1 or self.num_of_candidates < 1 or self.tournament_size < 1:
+            raise ValueError("cycle_adaptation, num_of_candidates and tournament_size must be positive")
+        if self.local_search_top_k < 0 or self.local_search_time <= 0:
+            raise ValueError("local_search_top_k must not be negative and local_search_time must be positive")
+        if self.initialization not in Population.INITIALIZATIONS:
+            raise ValueError("initialization must be one of {}".format(", ".join(Population.INITIALIZATIONS)))
+        if self.selection not in self.SELECTIONS:
+            raise ValueError("selection must be one of {}".format(", ".join(self.SELECTIONS)))
+        for name, weight in (self.constraint_weights or {}).items():
+            if name not in ConstraintSet.names():
+                raise ValueError("constraint_weights must only contain {}".format(", ".join(ConstraintSet.names())))
+            if weight < 0:
+                raise ValueError("constraint weights must not be negative")
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "RunConfig":
+        """Tạo cấu hình từ dict (vd: tham số của request), bỏ qua khoá không biết
+
+        Giá trị dạng chuỗi được chuyển sang đúng kiểu, chuỗi rỗng được coi là None.
+        """
+        kwargs = {}
+        for name, field_type in cls.FIELDS.items():
+            value = data.get(name)
+            if value is None or value == "":
+                continue
+            kwargs[name] = field_type(value)
+        return cls(**kwargs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    @classmethod
+    def add_arguments(cls, parser: argparse.ArgumentParser) -> None:
+        """Thêm 1 tham số dòng lệnh cho mỗi trường của FIELDS, mặc định giống RunConfig()"""
+        defaults = cls().to_dict()
+        choices = {"initialization": Population.INITIALIZATIONS, "selection": cls.SELECTIONS}
+        group = parser.add_argument_group("run config")
+        for name, field_type in cls.FIELDS.items():
+            flags = ["--" + name.replace("_", "-")]
+            if name in cls.FLAG_ALIASES:
+                flags.insert(0, cls.FLAG_ALIASES[name])
+            group.add_argument(*flags, dest=name, type=field_type, default=defaults[name], choices=choices.get(name),
+                               metavar="NAME=WEIGHT,..." if field_type is parse_weights else None,
+                               help=cls.HELP.get(name))
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> "RunConfig":
+        """Tạo cấu hình từ kết quả parse_args của parser đã gọi add_arguments"""
+        return cls.from_dict(vars(args))
+
+    def __repr__(self) -> str:
+        return "RunConfig({})".format(", ".join("{}={!r}".format(k, v) for k, v in self.to_dict().items()))
+
+
+class Termination:
+    """Điều kiện dừng của 1 lần chạy, lấy từ RunConfig
+
+    Các điều kiện được kiểm tra sau mỗi thế hệ theo thứ tự: lịch học không
+    còn vi phạm, số xung đột mục tiêu, hết thời gian, hết số lần tính độ thích
+    nghi, không cải thiện sau max_stagnation thế hệ, hết số thế hệ.
+
+     Attributes:
+        - reason (str): lý do dừng, None nếu chưa dừng
+        - best_fitness (float): độ thích nghi tốt nhất đã thấy
+        - stagnation (int): số thế hệ liên tiếp không cải thiện
+    """
+    PERFECT_FITNESS = "perfect_fitness"
+    TARGET_CONFLICTS = "target_conflicts"
+    TIME_BUDGET = "time_budget"
+    MAX_EVALUATIONS = "max_evaluations"
+    STAGNATION = "stagnation"
+    GENERATIONS = "generations"
+    STOPPED = "stopped"
+
+    def __init__(self, config: RunConfig) -> None:
+        self.config = config
+        self.reason = None  # type: Optional[str]
+        self.best_fitness = -1.0
+        self.stagnation = 0
+        self.__deadline = None  # type: Optional[float]
+        self.__evaluations = 0
+        self.__resumed = False
+
+    def resume(self, best_fitness: float, stagnation: int) -> None:
+        """Tiếp tục lần chạy trước (vd: từ checkpoint): lần gọi start() kế tiếp giữ
+        số thế hệ không cải thiện và tính số lần tính độ thích nghi từ 0 thay vì từ
+        GeneticAlgorithm.num_evaluations hiện tại"""
+        self.best_fitness = best_fitness
+        self.stagnation = stagnation
+        self.__resumed = True
+
+    def start(self, genetic_algorithm: "GeneticAlgorithm") -> None:
+        self.reason = None
+        self.__deadline = time.monotonic() + self.config.time_budget if self.config.time_budget else None
+        if self.__resumed:
+            self.__evaluations = 0
+            self.__resumed = False
+        else:
+            self.stagnation = 0
+            self.__evaluations = genetic_algorithm.num_evaluations
+        if genetic_algorithm.generation >= self.config.num_generations:
+            self.reason = self.GENERATIONS
+
+    def check(self, genetic_algorithm: "GeneticAlgorithm", population: Population) -> Optional[str]:
+        """Cập nhật trạng thái sau 1 thế hệ và trả về lý do dừng nếu cần dừng"""
+        best = population.chromosomes[0]
+        if best.get_fitness() > self.best_fitness:
+            self.best_fitness = best.get_fitness()
+            self.stagnation = 0
+        else:
+            self.stagnation += 1
+
+        if best.get_fitness() == 1.0:
+            self.reason = self.PERFECT_FITNESS
+        elif self.config.target_conflicts is not None and best.get_num_conflicts() <= self.config.target_conflicts:
+            self.reason = self.TARGET_CONFLICTS
+        elif self.__deadline is not None and time.monotonic() >= self.__deadline:
+            self.reason = self.TIME_BUDGET
+        elif self.config.max_evaluations is not None \
+                and genetic_algorithm.num_evaluations - self.__evaluations >= self.config.max_evaluations:
+            self.reason = self.MAX_EVALUATIONS
+        elif self.config.max_stagnation is not None and self.stagnation >= self.config.max_stagnation:
+            self.reason = self.STAGNATION
+        elif genetic_algorithm.generation >= self.config.num_generations:
+            self.reason = self.GENERATIONS
+        return self.reason
 
 
 class GeneticAlgorithm:
     generation = 0
 
-    POPULATION_SIZE = 10
-    MUTATION_RATE = 0.1
-    NUM_OF_ELITE = 2
-    CYCLE_ADAPTATION = 5
+    def __init__(self, problem: Optional[ProblemInstance] = None, evaluator=None, rng: Optional[random.Random] = None,
+                 config: Optional[RunConfig] = None, constraints: Optional[ConstraintSet] = None) -> None:
+        self.problem = problem if problem is not None else ProblemInstance.load()
+        self.evaluator = evaluator if evaluator is not None else SerialEvaluator()
+        self.rng = rng if rng is not None else random
+        self.config = config if config is not None else RunConfig()
+        self.constraints = constraints if constraints is not None \
+            else self.problem.constraints.weighted(self.config.constraint_weights)
+        self.termination = Termination(self.config)
+        self.local_search = LocalSearch(self.problem, self.rng)
+        self.num_evaluations = 0
+        self.observers = []  # type: List[Callable[[dict], None]]
+
+    def subscribe(self, observer: Callable[[dict], None]) -> None:
+        """Đăng ký hàm nhận thông tin sau mỗi lần gọi evolve
+
+        Thông tin gồm: generation, best_fitness, mean_fitness, num_conflicts,
+        num_evaluations và generation_time (giây). Khi không có ai đăng ký,
+        evolve không tốn thêm chi phí nào.
+        """
+        self.observers.append(observer)
+
+    def unsubscribe(self, observer: Callable[[dict], None]) -> None:
+        self.observers.remove(observer)
+
+    @property
+    def stop_reason(self) -> Optional[str]:
+        """Lý do dừng của lần gọi run() gần nhất (xem Termination)"""
+        return self.termination.reason
+
+    def run(self, population: Population, on_generation: Optional[Callable[[Population], bool]] = None) -> Population:
+        """Tiến hoá cho tới khi gặp 1 điều kiện dừng của config, lý do dừng ở stop_reason
+
+         Args:
+            - population (Population): quần thể ban đầu
+            - on_generation: hàm gọi sau mỗi thế hệ, trả về True để dừng sớm
+
+         Returns:
+            - Population: quần thể cuối cùng
+        """
+        self.termination.start(self)
+        while self.termination.reason is None:
+            population = self.evolve(population)
+            self.termination.check(self, population)
+            # on_generation (vd: Checkpointer.step) thấy trạng thái của Termination sau thế hệ này
+            if on_generation is not None and on_generation(population) and self.termination.reason is None:
+                self.termination.reason = Termination.STOPPED
+        return population
 
     def evolve(self, population: Population) -> Population:
+        start = time.perf_counter() if self.observers else 0.0
         self.generation += 1
+        if any(chromosome.get_fitness() < 0 for chromosome in population.chromosomes):
+            # Quần thể ban đầu chưa được tính độ thích nghi
+            self.__evaluate(population.chromosomes)
+            population.chromosomes.sort(key=lambda x: x.get_fitness(), reverse=True)
         population = self.__crossover_population(population)
         population = self.__mutate_population(population)
-        if self.generation % self.CYCLE_ADAPTATION == 0:
+        if self.generation % self.config.cycle_adaptation == 0:
             population = self.__adaptive_population(population)
-        for chromosome in population.chromosomes: chromosome.calculate_fitness()
+        self.__evaluate(population.chromosomes)
         population.chromosomes.sort(key=lambda x: x.get_fitness(), reverse=True)
+        if self.config.local_search_top_k:
+            population = self.__local_search_population(population)
+        if self.observers:
+            self.__notify(population, time.perf_counter() - start)
         return population
 
+    def __notify(self, population: Population, generation_time: float) -> None:
+        chromosomes = population.chromosomes
+        event = {
+            "generation": self.generation,
+            "best_fitness": chromosomes[0].get_fitness(),
+            "mean_fitness": sum(chromosome.get_fitness() for chromosome in chromosomes) / len(chromosomes),
+            "num_conflicts": chromosomes[0].get_num_conflicts(),
+            "num_evaluations": self.num_evaluations,
+            "generation_time": generation_time,
+        }
+        for observer in list(self.observers):
+            observer(event)
+
+    def __evaluate(self, chromosomes: List[Schedule]) -> None:
+        self.evaluator.evaluate(chromosomes)
+        self.num_evaluations += len(chromosomes)
+
+    @metrics.timed("crossover")
     def __crossover_population(self, population: Population) -> Population:
-        crossover_population = Population(0)
-        for i in range(self.NUM_OF_ELITE):
+        crossover_population = Population(0, self.problem, self.rng, constraints=self.constraints)
+        crossover_population.size = self.config.population_size
+        for i in range(min(self.config.num_of_elite, len(population.chromosomes))):
             crossover_population.chromosomes.append(population.chromosomes[i])
-        parent1, parent2 = crossover_population.chromosomes[0:2]
-        for _ in range(self.POPULATION_SIZE - self.NUM_OF_ELITE):
-            crossover_population.chromosomes.append(self.__crossover_chromosome(parent1, parent2))
+        select_parents = self.__parent_selection(population)
+        children = [self.__crossover_chromosome(*select_parents())
+                    for _ in range(self.config.population_size - len(crossover_population.chromosomes))]
+        self.__evaluate(children)
+        crossover_population.chromosomes.extend(children)
         return crossover_population
 
+    def __parent_selection(self, population: Population) -> Callable[[], Tuple[Schedule, Schedule]]:
+        """Hàm chọn 1 cặp cha mẹ theo config.selection
+
+        Quần thể đã được sắp xếp giảm dần theo độ thích nghi.
+        """
+        chromosomes = population.chromosomes
+        if self.config.selection == "best":
+            return lambda: (chromosomes[0], chromosomes[1])
+        if self.config.selection == "roulette":
+            cum_weights = []
+            total = 0.0
+            for chromosome in chromosomes:
+                total += chromosome.get_fitness()
+                cum_weights.append(total)
+            return lambda: tuple(self.rng.choices(chromosomes, cum_weights=cum_weights, k=2))
+        size = min(self.config.tournament_size, len(chromosomes))
+        indices = range(len(chromosomes))
+        return lambda: (chromosomes[min(self.rng.sample(indices, size))],
+                        chromosomes[min(self.rng.sample(indices, size))])
+
     def __crossover_chromosome(self, parent1: Schedule, parent2: Schedule) -> Schedule:
-        crossover_chromosome = Schedule().initialize()
-        for i in range(len(crossover_chromosome.genes)):
-            if random.random() > 0.5: crossover_chromosome.genes[i] = parent1.genes[i].copy()
-            else: crossover_chromosome.genes[i] = parent2.genes[i].copy()
-        crossover_chromosome.calculate_fitness()
+        crossover_chromosome = Schedule(self.problem, self.rng, self.constraints)
+        crossover_chromosome.genes.extend(
+            gene1.copy() if self.rng.random() > 0.5 else gene2.copy()
+            for gene1, gene2 in zip(parent1.genes, parent2.genes)
+        )
+        if metrics.enabled: metrics.count("genes_copied", len(crossover_chromosome.genes))
         return crossover_chromosome
 
+    @metrics.timed("mutation")
     def __mutate_population(self, population: Population) -> Population:
-        for i in range(self.NUM_OF_ELITE, self.POPULATION_SIZE):
+        for i in range(self.config.num_of_elite, len(population.chromosomes)):
             self.__mutate_chromosome(population.chromosomes[i])
         return population
 
     def __mutate_chromosome(self, chromosome: Schedule) -> Schedule:
-        _chromosome = Schedule().initialize()
+        num_mutated = 0
         for i in range(len(chromosome.genes)):
-            if random.random() < self.MUTATION_RATE: chromosome.genes[i] = _chromosome.genes[i]
+            if self.rng.random() < self.config.mutation_rate:
+                chromosome.genes[i] = self.problem.sample_class(i, self.rng)
+                num_mutated += 1
+        if metrics.enabled: metrics.count("genes_copied", num_mutated)
         return chromosome
 
+    def __local_search_population(self, population: Population) -> Population:
+        """Giai đoạn memetic: tìm kiếm cục bộ trên config.local_search_top_k cá thể tốt nhất
+
+        Các cá thể dùng chung config.local_search_time giây của thế hệ. Giống
+        giai đoạn thích nghi, mỗi cá thể được tìm kiếm tính là 1 lần tính độ
+        thích nghi; cá thể bị bỏ qua vì hết thời gian không được tính.
+        """
+        deadline = time.perf_counter() + self.config.local_search_time
+        for chromosome in population.chromosomes[:self.config.local_search_top_k]:
+            if time.perf_counter() >= deadline:
+                break
+            self.local_search.improve(chromosome, deadline)
+            self.num_evaluations += 1
+        population.chromosomes.sort(key=lambda x: x.get_fitness(), reverse=True)
+        return population
+
     """
     OUR HEURISTIC
     Sử dụng thêm 1 giai đoạn thích nghi giống sinh học tự nhiên.
     Thay thế những gene không tốt để thích nghi với điều kiện.
+    Với mỗi lớp bị xung đột, thử config.num_of_candidates cách xếp ngẫu nhiên và chỉ
+    nhận cách xếp làm giảm chi phí (số xung đột và điểm phạt của các ràng buộc
+    nhân trọng số), nên độ thích nghi của lịch học không bao giờ giảm.
     """
 
+    @metrics.timed("adaptation")
     def __adaptive_population(self, population: Population) -> Population:
-        for i in range(self.POPULATION_SIZE):
+        for i in range(len(population.chromosomes)):
             self.__adaptive_chromosome(population.chromosomes[i])
+        self.num_evaluations += len(population.chromosomes)
         return population
 
     def __adaptive_chromosome(self, chromosome: Schedule) -> Schedule:
-        _chromosome = Schedule().initialize()
-        adap_chromosome = chromosome.copy()
+        # Đột biến thay gene trực tiếp nên phải dựng lại chỉ mục xung đột
+        chromosome.build_conflict_index()
+        conflict_index = chromosome.conflict_index
+        num_adapted = 0
         for i in range(len(chromosome.genes)):
-            if chromosome.genes[i].conflict:
-                adap_chromosome.genes[i] = _chromosome.genes[i]
-                adap_chromosome.calculate_fitness()
-                if not adap_chromosome.genes[i].conflict:
-                    chromosome.genes[i] = _chromosome.genes[i]
+            if not conflict_index.is_conflicted(i):
+                continue
+            best, best_cost = None, 0.0
+            for _ in range(self.config.num_of_candidates):
+                candidate = self.problem.sample_class(i, self.rng)
+                _, cost = conflict_index.delta(i, candidate.key())
+                if cost < best_cost:
+                    best, best_cost = candidate, cost
+            if best is not None:
+                chromosome.replace_gene(i, best)
+                num_adapted += 1
+        if metrics.enabled: metrics.count("genes_copied", num_adapted)
         return chromosome
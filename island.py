@@ -0,0 +1,221 @@
+import argparse
+import time
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Connection
+from typing import Dict, List, Optional, Tuple
+
+from prettytable import PrettyTable
+
+from genetic_algorithm import GeneticAlgorithm, Population, RunConfig, Termination
+from schedule import ProblemInstance, Schedule, derive_rng
+
+
+def _run_island(island_id: int, conn: Connection, data_dir: str, config: RunConfig) -> None:
+    """Tiến trình của 1 đảo: nhận lệnh tiến hoá, trả về cá thể tốt nhất để di cư"""
+    rng = derive_rng(config.seed, "island", island_id)
+    problem = ProblemInstance.load(data_dir)
+    genetic_algorithm = GeneticAlgorithm(problem, rng=rng, config=config)
+    population = Population(config.population_size, problem, rng, config.initialization, genetic_algorithm.constraints)
+    genetic_algorithm.evaluator.evaluate(population.chromosomes)
+    population.chromosomes.sort(key=lambda x: x.get_fitness(), reverse=True)
+
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        num_generations, num_migrants, migrants = message
+
+        if migrants:
+            immigrants = []
+            for encoded in migrants:
+                immigrant = Schedule(problem, rng, genetic_algorithm.constraints)
+                immigrant.classes.extend(problem.decode(encoded))
+                immigrants.append(immigrant)
+            genetic_algorithm.evaluator.evaluate(immigrants)
+            immigrants.sort(key=lambda x: x.get_fitness(), reverse=True)
+            del immigrants[len(population.chromosomes) - config.num_of_elite:]
+            if immigrants:
+                population.chromosomes[-len(immigrants):] = immigrants
+            population.chromosomes.sort(key=lambda x: x.get_fitness(), reverse=True)
+
+        generations = 0
+        for _ in range(num_generations):
+            population = genetic_algorithm.evolve(population)
+            generations += 1
+            if population.chromosomes[0].get_fitness() == 1.0:
+                break
+
+        best = population.chromosomes[0]
+        conn.send((
+            generations,
+            genetic_algorithm.num_evaluations,
+            best.get_fitness(),
+            best.get_num_conflicts(),
+            problem.encode(best.classes),
+            [problem.encode(chromosome.classes) for chromosome in population.chromosomes[:num_migrants]],
+        ))
+    conn.close()
+
+
+class IslandResult:
+    """Kết quả chạy mô hình đảo
+
+     Attributes:
+        - best: Lịch học tốt nhất trên tất cả các đảo
+        - island_fitness: Độ thích nghi tốt nhất của từng đảo
+        - island_conflicts: Số xung đột của cá thể tốt nhất của từng đảo
+        - generations: Tổng số thế hệ đã chạy trên tất cả các đảo
+        - elapsed: Thời gian chạy (giây)
+        - stop_reason: Lý do dừng (xem Termination)
+    """
+
+    def __init__(self, best: Schedule, island_fitness: List[float], island_conflicts: List[int], generations: int, elapsed: float,
+                 stop_reason: Optional[str] = None) -> None:
+        self.best = best
+        self.island_fitness = island_fitness
+        self.island_conflicts = island_conflicts
+        self.generations = generations
+        self.elapsed = elapsed
+        self.stop_reason = stop_reason
+
+    @property
+    def generations_per_second(self) -> float:
+        return self.generations / self.elapsed if self.elapsed > 0 else 0.0
+
+    def print_report(self) -> None:
+        x = PrettyTable()
+        x.field_names = ["island", "fitness", "conflicts"]
+        for idx, (fitness, conflicts) in enumerate(zip(self.island_fitness, self.island_conflicts)):
+            x.add_row([idx, fitness, conflicts])
+        print(x)
+        print("{} generations in {:.2f}s ({:.1f} generations/s), stopped: {}".format(
+            self.generations, self.elapsed, self.generations_per_second, self.stop_reason))
+
+
+class IslandModel:
+    """Mô hình đảo: nhiều quần thể tiến hoá độc lập trên nhiều tiến trình
+
+    Sau mỗi `migration_interval` thế hệ, mỗi đảo gửi `num_migrants` cá thể
+    tốt nhất sang các đảo láng giềng để thay cho các cá thể kém nhất.
+
+     Attributes:
+        - num_islands: Số đảo (số tiến trình)
+        - config: Tham số thuật toán của mỗi đảo (số cá thể, số thế hệ, hạt giống, ...)
+        - migration_interval: Số thế hệ giữa 2 lần di cư
+        - num_migrants: Số cá thể di cư mỗi lần
+        - topology: "ring" (sang đảo kế tiếp) hoặc "full" (sang mọi đảo)
+    """
+    TOPOLOGIES = ("ring", "full")
+
+    def __init__(self, num_islands: int = 4, config: Optional[RunConfig] = None, migration_interval: int = 5,
+                 num_migrants: int = 1, topology: str = "ring", data_dir: str = "./data") -> None:
+        if topology not in self.TOPOLOGIES:
+            raise ValueError("topology must be one of {}".format(", ".join(self.TOPOLOGIES)))
+        self.num_islands = num_islands
+        self.config = config if config is not None else RunConfig()
+        self.migration_interval = migration_interval
+        self.num_migrants = num_migrants
+        self.topology = topology
+        self.data_dir = data_dir
+
+    def neighbours(self, island_id: int) -> List[int]:
+        """Các đảo nhận cá thể di cư từ đảo `island_id`"""
+        if self.topology == "ring":
+            return [(island_id + 1) % self.num_islands] if self.num_islands > 1 else []
+        return [i for i in range(self.num_islands) if i != island_id]
+
+    def run(self, num_generations: Optional[int] = None) -> IslandResult:
+        num_generations = num_generations if num_generations is not None else self.config.num_generations
+        problem = ProblemInstance.load(self.data_dir)
+        connections = []
+        processes = []
+        for island_id in range(self.num_islands):
+            conn, child_conn = Pipe()
+            process = Process(
+                target=_run_island,
+                args=(island_id, child_conn, self.data_dir, self.config),
+                daemon=True,
+            )
+            process.start()
+            connections.append(conn)
+            processes.append(process)
+
+        start = time.perf_counter()
+        incoming = {i: [] for i in range(self.num_islands)}  # type: Dict[int, List[bytes]]
+        island_fitness = [-1.0] * self.num_islands
+        island_conflicts = [0] * self.num_islands
+        island_evaluations = [0] * self.num_islands
+        best = (-1.0, b"")  # type: Tuple[float, bytes]
+        total_generations = 0
+        stagnation = 0
+        stop_reason = Termination.GENERATIONS
+        try:
+            generation = 0
+            while generation < num_generations:
+                num_epoch = min(self.migration_interval, num_generations - generation)
+                for island_id, conn in enumerate(connections):
+                    conn.send((num_epoch, self.num_migrants, incoming[island_id]))
+                incoming = {i: [] for i in range(self.num_islands)}
+
+                best_fitness = best[0]
+                for island_id, conn in enumerate(connections):
+                    generations, island_evaluations[island_id], fitness, conflicts, encoded, migrants = conn.recv()
+                    total_generations += generations
+                    island_fitness[island_id] = fitness
+                    island_conflicts[island_id] = conflicts
+                    if fitness > best[0]:
+                        best = (fitness, encoded)
+                    for neighbour in self.neighbours(island_id):
+                        incoming[neighbour].extend(migrants)
+
+                generation += num_epoch
+                stagnation = 0 if best[0] > best_fitness else stagnation + num_epoch
+                # Các điều kiện dừng của RunConfig, kiểm tra sau mỗi lần di cư
+                if best[0] == 1.0:
+                    stop_reason = Termination.PERFECT_FITNESS
+                elif self.config.target_conflicts is not None and min(island_conflicts) <= self.config.target_conflicts:
+                    stop_reason = Termination.TARGET_CONFLICTS
+                elif self.config.time_budget and time.perf_counter() - start >= self.config.time_budget:
+                    stop_reason = Termination.TIME_BUDGET
+                elif self.config.max_evaluations is not None and sum(island_evaluations) >= self.config.max_evaluations:
+                    stop_reason = Termination.MAX_EVALUATIONS
+                elif self.config.max_stagnation is not None and stagnation >= self.config.max_stagnation:
+                    stop_reason = Termination.STAGNATION
+                else:
+                    continue
+                break
+        finally:
+            for conn in connections:
+                try:
+                    conn.send(None)
+                except (BrokenPipeError, EOFError, OSError):
+                    pass  # tiến trình con đã dừng (vd: bị lỗi), không che lỗi gốc
+            for process in processes:
+                process.join()
+        elapsed = time.perf_counter() - start
+
+        schedule = Schedule(problem, constraints=problem.constraints.weighted(self.config.constraint_weights))
+        schedule.classes.extend(problem.decode(best[1]))
+        schedule.calculate_fitness()
+        return IslandResult(schedule, island_fitness, island_conflicts, total_generations, elapsed, stop_reason)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--islands", type=int, default=4)
+    parser.add_argument("--interval", type=int, default=5, help="số thế hệ giữa 2 lần di cư")
+    parser.add_argument("--migrants", type=int, default=1)
+    parser.add_argument("--topology", choices=IslandModel.TOPOLOGIES, default="ring")
+    RunConfig.add_arguments(parser)
+    args = parser.parse_args()
+
+    island_model = IslandModel(
+        num_islands=args.islands,
+        config=RunConfig.from_args(args),
+        migration_interval=args.interval,
+        num_migrants=args.migrants,
+        topology=args.topology,
+    )
+    result = island_model.run()
+    result.print_report()
+    result.best.save()
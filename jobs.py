@@ -0,0 +1,263 @@
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from checkpoint import Checkpoint, Checkpointer
+from constraints import Stability
+from genetic_algorithm import GeneticAlgorithm, Population, RunConfig
+from profiling import metrics
+from schedule import ProblemInstance, Schedule, derive_rng
+from warm_start import WarmStart
+
+
+class JobLimitError(Exception):
+    """Số công việc đang chờ/chạy đã đạt giới hạn"""
+    pass
+
+
+class Job:
+    """Công việc giải bài toán xếp lịch chạy nền
+
+     Attributes:
+        - id (str): Mã công việc
+        - status (str): queued, running, done, cancelled hoặc failed
+        - progress (deque): thông tin của MAX_PROGRESS thế hệ gần nhất
+        - result (Schedule): lịch học tốt nhất khi hoàn thành
+        - metrics (dict): số liệu đo được trong lần chạy nếu metrics được bật
+        - checkpoint_path (str): file checkpoint, None nếu không ghi checkpoint
+        - config (RunConfig): tham số của lần chạy
+        - stop_reason (str): lý do dừng của thuật toán (xem Termination)
+        - fitness_cache (dict): số lần trúng/trượt bộ nhớ đệm độ thích nghi trong lần chạy
+        - resume (bool): tiếp tục từ checkpoint mới nhất nếu có
+        - warm_start (bool): xếp lại từ lịch học đã lưu thay vì quần thể ngẫu nhiên
+        - stability_weight (float): trọng số phạt mỗi lớp khác lịch học đã lưu khi dùng warm_start
+        - changes (int): số lớp có cách xếp khác lịch học đã lưu khi dùng warm_start
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    CANCELLED = "cancelled"
+    FAILED = "failed"
+    MAX_PROGRESS = 1000
+
+    def __init__(self, config: Optional[RunConfig] = None, checkpoint_path: Optional[str] = None,
+                 checkpoint_interval: int = 10, resume: bool = False, warm_start: bool = False,
+                 stability_weight: float = Stability.weight) -> None:
+        self.id = uuid.uuid4().hex
+        self.config = config if config is not None else RunConfig()
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.resume = resume
+        self.warm_start = warm_start
+        self.stability_weight = stability_weight
+        self.changes = None  # type: Optional[int]
+        self.resumed_from = None  # type: Optional[int]
+        self.stop_reason = None  # type: Optional[str]
+        self.fitness_cache = None  # type: Optional[dict]
+        self.status = self.QUEUED
+        self.progress = deque(maxlen=self.MAX_PROGRESS)  # type: deque
+        self.result = None  # type: Optional[Schedule]
+        self.error = None  # type: Optional[str]
+        self.metrics = None  # type: Optional[dict]
+        self.created_at = time.time()
+        self.__cancel = threading.Event()
+        self.__subscribers = []  # type: List[queue.Queue]
+        self.__lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self.status in (self.QUEUED, self.RUNNING)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.__cancel.is_set()
+
+    def cancel(self) -> None:
+        """Huỷ công việc; công việc chưa chạy kết thúc ngay để không giữ chỗ trong hàng đợi"""
+        with self.__lock:
+            self.__cancel.set()
+            queued = self.status == self.QUEUED
+            if queued:
+                self.status = self.CANCELLED
+        if queued:
+            self.__publish(None)
+
+    def history(self, since: Optional[int] = None) -> List[dict]:
+        """Thông tin của các thế hệ sau thế hệ `since` (tất cả nếu None) còn được giữ lại"""
+        with self.__lock:
+            return [event for event in self.progress if since is None or event["generation"] > since]
+
+    def events(self, timeout: float = 15.0) -> Iterator[Optional[dict]]:
+        """Lần lượt trả về thông tin của từng thế hệ cho tới khi công việc kết thúc
+
+        Trả về None sau mỗi `timeout` giây không có thông tin mới để bên gọi
+        có thể giữ kết nối.
+        """
+        events = queue.Queue()  # type: queue.Queue
+        with self.__lock:
+            history = list(self.progress)
+            active = self.active
+            if active:
+                self.__subscribers.append(events)
+        yield from history
+        if not active:
+            return
+        try:
+            while True:
+                try:
+                    event = events.get(timeout=timeout)
+                except queue.Empty:
+                    yield None
+                    continue
+                if event is None:
+                    return
+                yield event
+        finally:
+            with self.__lock:
+                if events in self.__subscribers:
+                    self.__subscribers.remove(events)
+
+    def __publish(self, event: Optional[dict]) -> None:
+        with self.__lock:
+            if event is not None:
+                self.progress.append(event)
+            for subscriber in self.__subscribers:
+                subscriber.put(event)
+
+    def __finish(self, status: str) -> None:
+        with self.__lock:
+            self.status = status
+        self.__publish(None)
+
+    def run(self) -> None:
+        with self.__lock:
+            if self.status != self.QUEUED:
+                # Đã bị huỷ khi còn trong hàng đợi
+                return
+            self.status = self.RUNNING
+        snapshot = metrics.snapshot() if metrics.enabled else None
+        checkpointer = None
+        try:
+            start = time.perf_counter()
+            problem = ProblemInstance.load()
+            cache_stats = problem.fitness_cache.stats()
+            rng = derive_rng(self.config.seed)
+            warm_start = WarmStart(problem, Schedule.load(registry=problem.registry), self.config,
+                                   self.stability_weight, rng) if self.warm_start else None
+            if warm_start is not None:
+                genetic_algorithm = warm_start.genetic_algorithm()
+            else:
+                genetic_algorithm = GeneticAlgorithm(problem, rng=rng, config=self.config)
+            checkpoint = Checkpoint.latest(self.checkpoint_path) if self.checkpoint_path and self.resume else None
+            if checkpoint is not None:
+                population = checkpoint.restore(problem, genetic_algorithm)
+                self.resumed_from = genetic_algorithm.generation
+            elif warm_start is not None:
+                # warm_start.solve() tạo quần thể từ lịch học đã sửa
+                population = None
+            else:
+                population = Population(size=self.config.population_size, problem=problem, rng=rng,
+                                        initialization=self.config.initialization,
+                                        constraints=genetic_algorithm.constraints)
+            if self.checkpoint_path:
+                checkpointer = Checkpointer(self.checkpoint_path, problem, self.checkpoint_interval, checkpoint,
+                                            genetic_algorithm.constraints)
+            genetic_algorithm.subscribe(
+                lambda event: self.__publish(dict(event, elapsed=time.perf_counter() - start)))
+
+            def on_generation(population: Population) -> bool:
+                if checkpointer is not None:
+                    checkpointer.step(genetic_algorithm, population)
+                return self.cancelled
+
+            if not self.cancelled:
+                if warm_start is not None:
+                    population = warm_start.solve(genetic_algorithm, population, on_generation)
+                    self.stop_reason = warm_start.stop_reason
+                else:
+                    population = genetic_algorithm.run(population, on_generation)
+                    self.stop_reason = genetic_algorithm.stop_reason
+                self.fitness_cache = {
+                    name: value - cache_stats[name]
+                    for name, value in problem.fitness_cache.stats().items() if name in ("hits", "misses")
+                }
+            if checkpointer is not None and population is not None:
+                checkpointer.step(genetic_algorithm, population, force=True)
+            if self.cancelled:
+                self.__finish(self.CANCELLED)
+                return
+            self.result = population.chromosomes[0]
+            if warm_start is not None:
+                self.changes = warm_start.num_changes(self.result)
+            self.result.save()
+            if snapshot is not None:
+                self.metrics = metrics.report(since=snapshot)
+            self.__finish(self.DONE)
+        except Exception as e:
+            self.error = str(e)
+            self.__finish(self.FAILED)
+        finally:
+            if checkpointer is not None:
+                checkpointer.close()
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "config": self.config.to_dict(),
+            "resumed_from": self.resumed_from,
+            "warm_start": self.warm_start,
+            "stability_weight": self.stability_weight,
+            "changes": self.changes,
+            "stop_reason": self.stop_reason,
+            "fitness_cache": self.fitness_cache,
+            "progress": self.progress[-1] if self.progress else None,
+            "error": self.error,
+            "metrics": self.metrics,
+        }
+
+
+class JobManager:
+    """Quản lý công việc chạy nền trên 1 nhóm luồng
+
+     Attributes:
+        - max_workers (int): Số công việc chạy đồng thời
+        - max_active (int): Số công việc tối đa đang chờ hoặc đang chạy
+        - max_history (int): Số công việc đã kết thúc được giữ lại
+    """
+
+    def __init__(self, max_workers: int = 1, max_active: int = 2, max_history: int = 100) -> None:
+        self.max_workers = max_workers
+        self.max_active = max_active
+        self.max_history = max_history
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.__jobs = OrderedDict()  # type: Dict[str, Job]
+        self.__lock = threading.Lock()
+
+    def submit(self, job: Job) -> Job:
+        with self.__lock:
+            if sum(1 for _job in self.__jobs.values() if _job.active) >= self.max_active:
+                raise JobLimitError("Too many active jobs")
+            self.__jobs[job.id] = job
+            self.__prune()
+        self.__executor.submit(job.run)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.__lock:
+            return self.__jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def __prune(self) -> None:
+        finished = [job_id for job_id, job in self.__jobs.items() if not job.active]
+        for job_id in finished[:max(0, len(finished) - self.max_history)]:
+            del self.__jobs[job_id]
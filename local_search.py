@@ -0,0 +1,103 @@
+import random
+import time
+from typing import Iterator, Optional
+
+from profiling import metrics
+from schedule import Class, ProblemInstance, Schedule
+
+
+class LocalSearch:
+    """Tìm kiếm cục bộ kiểu first-improvement trên 1 lịch học
+
+    Với mỗi lớp bị xung đột hoặc vi phạm ràng buộc, lần lượt thử chuyển lớp
+    sang (ngày, ca) khác, sang phòng khác cùng loại, sang giảng viên khác của
+    môn học, rồi đổi (ngày, ca) với 1 lớp khác, và nhận ngay bước đầu tiên
+    làm giảm chi phí (số xung đột và điểm phạt nhân trọng số). Độ thay đổi
+    được tính bằng ConflictIndex.delta nên mỗi bước thử chỉ tốn O(kích thước
+    nhóm) thay vì tính lại cả lịch học.
+
+     Attributes:
+        - problem: Dữ liệu bài toán
+        - rng: Bộ sinh số ngẫu nhiên
+        - num_rooms (int): Số phòng được thử cho mỗi lớp
+        - num_swaps (int): Số lớp được thử đổi (ngày, ca) cho mỗi lớp
+    """
+
+    def __init__(self, problem: ProblemInstance, rng: Optional[random.Random] = None, num_rooms: int = 8,
+                 num_swaps: int = 8) -> None:
+        self.problem = problem
+        self.rng = rng if rng is not None else random
+        self.num_rooms = num_rooms
+        self.num_swaps = num_swaps
+        self.slots = [(day, shift) for day in range(len(Class.DAYS)) for shift in problem.shifts]
+
+    @metrics.timed("local_search")
+    def improve(self, chromosome: Schedule, deadline: float) -> int:
+        """Cải thiện lịch học cho tới khi không còn bước tốt hơn hoặc hết thời gian
+
+         Args:
+            - chromosome (Schedule): lịch học, được sửa trực tiếp
+            - deadline (float): thời điểm dừng theo time.perf_counter()
+
+         Returns:
+            - int: số bước đã nhận
+        """
+        chromosome.build_conflict_index()
+        conflict_index = chromosome.conflict_index
+        num_moves = 0
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+            violated = [i for i in range(len(chromosome.classes)) if conflict_index.is_violated(i)]
+            self.rng.shuffle(violated)
+            for i in violated:
+                if time.perf_counter() >= deadline:
+                    break
+                if not conflict_index.is_violated(i):
+                    continue
+                if self.__move(chromosome, i) or self.__swap(chromosome, i):
+                    num_moves += 1
+                    improved = True
+        if metrics.enabled: metrics.count("local_search_moves", num_moves)
+        return num_moves
+
+    def __neighbours(self, clas: Class) -> Iterator[Class]:
+        slots = list(self.slots)
+        self.rng.shuffle(slots)
+        for day, shift in slots:
+            if day != clas.day or shift is not clas.shift:
+                yield Class(clas.id, clas.course, clas.lecturer, clas.room, day, shift)
+        rooms = self.problem.rooms_practice if clas.course.is_practice else self.problem.rooms_npractice
+        for room in self.rng.sample(rooms, min(self.num_rooms, len(rooms))):
+            if room is not clas.room:
+                yield Class(clas.id, clas.course, clas.lecturer, room, clas.day, clas.shift)
+        for lecturer in clas.course.lecturers or ():
+            if lecturer is not clas.lecturer:
+                yield Class(clas.id, clas.course, lecturer, clas.room, clas.day, clas.shift)
+
+    def __move(self, chromosome: Schedule, i: int) -> bool:
+        conflict_index = chromosome.conflict_index
+        for candidate in self.__neighbours(chromosome.classes[i]):
+            _, cost = conflict_index.delta(i, candidate.key())
+            if cost < 0:
+                chromosome.replace_gene(i, candidate)
+                return True
+        return False
+
+    def __swap(self, chromosome: Schedule, i: int) -> bool:
+        conflict_index = chromosome.conflict_index
+        clas = chromosome.classes[i]
+        for j in self.rng.sample(range(len(chromosome.classes)), min(self.num_swaps, len(chromosome.classes))):
+            other = chromosome.classes[j]
+            if j == i or (other.day == clas.day and other.shift is clas.shift):
+                continue
+            moved = Class(i, clas.course, clas.lecturer, clas.room, other.day, other.shift)
+            swapped = Class(j, other.course, other.lecturer, other.room, clas.day, clas.shift)
+            _, cost = conflict_index.delta(i, moved.key())
+            chromosome.replace_gene(i, moved)
+            _, _cost = conflict_index.delta(j, swapped.key())
+            if cost + _cost < 0:
+                chromosome.replace_gene(j, swapped)
+                return True
+            chromosome.replace_gene(i, clas)
+        return False
@@ -0,0 +1,107 @@
+import cProfile
+import functools
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+
+class Metrics:
+    """Bộ đếm và đo thời gian cho các bước chính của thuật toán
+
+    Khi chưa bật (mặc định), các hàm được đánh dấu bằng `timed` chỉ tốn thêm
+    1 lần kiểm tra `enabled`.
+
+     Attributes:
+        - enabled (bool): có đang thu thập số liệu hay không
+        - counters: tên -> giá trị bộ đếm
+        - timers: tên -> [số lần gọi, tổng thời gian (giây)]
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.counters = {}  # type: Dict[str, int]
+        self.timers = {}  # type: Dict[str, list]
+        self.__lock = threading.Lock()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.counters = {}
+            self.timers = {}
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self.__lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record(self, name: str, elapsed: float) -> None:
+        with self.__lock:
+            timer = self.timers.setdefault(name, [0, 0.0])
+            timer[0] += 1
+            timer[1] += elapsed
+
+    def timed(self, name: str) -> Callable:
+        """Decorator đo thời gian và số lần gọi 1 hàm"""
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> Dict:
+        with self.__lock:
+            return {
+                "counters": dict(self.counters),
+                "timers": {name: list(timer) for name, timer in self.timers.items()},
+            }
+
+    def report(self, since: Optional[Dict] = None) -> Dict:
+        """Báo cáo số liệu, tính từ lúc lấy `since` (kết quả của snapshot) nếu có"""
+        current = self.snapshot()
+        base = since or {"counters": {}, "timers": {}}
+        counters = {
+            name: value - base["counters"].get(name, 0)
+            for name, value in current["counters"].items()
+        }
+        timers = {}
+        for name, (calls, total) in current["timers"].items():
+            _calls, _total = base["timers"].get(name, (0, 0.0))
+            calls, total = calls - _calls, total - _total
+            timers[name] = {
+                "calls": calls,
+                "total": total,
+                "mean": total / calls if calls else 0.0,
+            }
+        return {"enabled": self.enabled, "counters": counters, "timers": timers}
+
+    @contextmanager
+    def profile(self, filepath: str, sort: str = "cumulative", limit: Optional[int] = None) -> Iterator[cProfile.Profile]:
+        """Chạy cProfile trong khối lệnh và ghi kết quả pstats ra `filepath`
+
+        Nếu có `limit`, in thêm `limit` dòng đầu của bảng thống kê.
+        """
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield profiler
+        finally:
+            profiler.disable()
+            profiler.dump_stats(filepath)
+            if limit:
+                pstats.Stats(filepath).sort_stats(sort).print_stats(limit)
+
+
+metrics = Metrics()
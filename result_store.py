@@ -0,0 +1,213 @@
+import json
+import os
+import stat
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+from schedule import Class, Registry
+
+
+def file_mode(filepath: str) -> int:
+    """Quyền của file được ghi đè: giữ quyền của file cũ, file mới theo umask như open()
+
+    tempfile.mkstemp luôn tạo file với quyền 0600 và os.replace giữ nguyên
+    quyền đó, nên file tạm phải được đổi quyền trước khi đổi tên.
+    """
+    try:
+        return stat.S_IMODE(os.stat(filepath).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+class ResultStore:
+    """Lưu và đọc lịch học đã xếp
+
+    Mỗi môn học, giảng viên, phòng học và ca học chỉ được ghi 1 lần. Lớp học
+    được lưu dưới dạng mảng chỉ số tham chiếu tới các danh sách đó, các nhóm
+    theo môn học/giảng viên/phòng học chỉ lưu vị trí của lớp trong "classes".
+    File định dạng cũ (4 bản sao của mỗi lớp) vẫn đọc được.
+
+     Attributes:
+        - filepath (str): đường dẫn file kết quả
+        - writes (int): số lần đã ghi file trong tiến trình, dùng để làm mới bộ nhớ đệm
+    """
+    VERSION = 2
+    writes = 0
+    FIELDS = ["id", "course", "lecturer", "room", "day", "shift", "conflict"]
+
+    def __init__(self, filepath: str = "./data/results.json") -> None:
+        self.filepath = filepath
+
+    def write(self, classes: List[Class]) -> None:
+        """Ghi danh sách lớp học vào file (ghi ra file tạm rồi đổi tên)
+
+         Args:
+            - classes (List[Class]): danh sách lớp học
+        """
+        courses, lecturers, rooms, shifts = {}, {}, {}, {}
+        data = {
+            "version": self.VERSION,
+            "courses": [],
+            "lecturers": [],
+            "rooms": [],
+            "shifts": [],
+            "fields": self.FIELDS,
+            "classes": [],
+            "group_by_courses": {},
+            "group_by_lecturers": {},
+            "group_by_rooms": {},
+        }
+        for position, clas in enumerate(classes):
+            if clas.course.id not in courses:
+                courses[clas.course.id] = len(data["courses"])
+                data["courses"].append({
+                    "id": clas.course.id,
+                    "name": clas.course.name,
+                    "num_classes": clas.course.num_classes,
+                    "is_practice": clas.course.is_practice,
+                })
+            if clas.lecturer.id not in lecturers:
+                lecturers[clas.lecturer.id] = len(data["lecturers"])
+                data["lecturers"].append({"id": clas.lecturer.id, "name": clas.lecturer.name})
+            if clas.room.id not in rooms:
+                rooms[clas.room.id] = len(data["rooms"])
+                data["rooms"].append({"id": clas.room.id, "name": clas.room.name})
+            if clas.shift.id not in shifts:
+                shifts[clas.shift.id] = len(data["shifts"])
+                data["shifts"].append({"id": clas.shift.id, "time": clas.shift.time})
+
+            data["classes"].append([
+                clas.id,
+                courses[clas.course.id],
+                lecturers[clas.lecturer.id],
+                rooms[clas.room.id],
+                clas.day,
+                shifts[clas.shift.id],
+                int(bool(clas.conflict)),
+            ])
+            data["group_by_courses"].setdefault(clas.course.name, []).append(position)
+            data["group_by_lecturers"].setdefault(clas.lecturer.name, []).append(position)
+            data["group_by_rooms"].setdefault(clas.room.name, []).append(position)
+
+        directory = os.path.dirname(os.path.abspath(self.filepath))
+        fd, tmp_path = tempfile.mkstemp(prefix=".results-", suffix=".json", dir=directory)
+        try:
+            os.fchmod(fd, file_mode(self.filepath))
+            with os.fdopen(fd, "w") as jsonfile:
+                jsonfile.write(json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+                jsonfile.flush()
+                os.fsync(jsonfile.fileno())
+            os.replace(tmp_path, self.filepath)
+            ResultStore.writes += 1
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def read(self, registry: Optional[Registry] = None) -> List[Class]:
+        """Đọc danh sách lớp học từ file (định dạng mới hoặc cũ)
+
+         Args:
+            - registry (Registry): bảng đối tượng dùng chung, chỉ đọc (xem read_groups)
+
+         Returns:
+            - List[Class]: danh sách lớp học
+        """
+        return self.read_groups(registry)["classes"]
+
+    def read_groups(self, registry: Optional[Registry] = None) -> Dict:
+        """Đọc danh sách lớp học và các nhóm theo môn học, giảng viên, phòng học
+
+         Args:
+            - registry (Registry): bảng đối tượng dùng chung, chỉ đọc; đối tượng chỉ có
+              trong file được tạo trong 1 registry con
+
+         Returns:
+            - Dict: "classes", "group_by_courses", "group_by_lecturers", "group_by_rooms"
+        """
+        registry = Registry(registry)
+        with open(self.filepath) as file_json:
+            data = json.load(file_json)
+        if data.get("version") != self.VERSION:
+            return self.read_legacy(data, registry)
+
+        courses = [
+            registry.course(
+                id=course["id"],
+                name=course["name"],
+                lecturers=None,
+                num_classes=course["num_classes"],
+                is_practice=course["is_practice"],
+            ) for course in data["courses"]
+        ]
+        lecturers = [registry.lecturer(id=lecturer["id"], name=lecturer["name"]) for lecturer in data["lecturers"]]
+        rooms = [registry.room(id=room["id"], name=room["name"]) for room in data["rooms"]]
+        shifts = [registry.shift(id=shift["id"], time=shift["time"]) for shift in data["shifts"]]
+        classes = [
+            Class(
+                id=class_id,
+                course=courses[course],
+                lecturer=lecturers[lecturer],
+                room=rooms[room],
+                day=day,
+                shift=shifts[shift],
+                conflict=bool(conflict),
+            ) for class_id, course, lecturer, room, day, shift, conflict in data["classes"]
+        ]
+        groups = {"classes": classes}
+        for group in ("group_by_courses", "group_by_lecturers", "group_by_rooms"):
+            groups[group] = {
+                name: [classes[position] for position in positions]
+                for name, positions in data[group].items()
+            }
+        return groups
+
+    @classmethod
+    def read_legacy(cls, data: Dict, registry: Optional[Registry] = None) -> Dict:
+        """Đọc dữ liệu định dạng cũ, mỗi lớp được lưu đầy đủ trong "classes" """
+        registry = registry if registry is not None else Registry()
+        classes = []
+        for clas in data["classes"]:
+            classes.append(Class(
+                id=clas["id"],
+                course=registry.course(
+                    id=clas["course"]["id"],
+                    name=clas["course"]["name"],
+                    lecturers=None,
+                    is_practice=clas["course"]["is_practice"],
+                    num_classes=clas["course"]["num_classes"]
+                ),
+                lecturer=registry.lecturer(
+                    id=clas["lecturer"]["id"],
+                    name=clas["lecturer"]["name"],
+                ),
+                room=registry.room(
+                    id=clas["room"]["id"],
+                    name=clas["room"]["name"]
+                ),
+                day=clas["day"],
+                shift=registry.shift(
+                    id=clas["shift"]["id"],
+                    time=clas["shift"]["time"]
+                ),
+                conflict=clas["conflict"]
+            ))
+        groups = {"classes": classes}
+        for group, key in (("group_by_courses", lambda x: x.course.name),
+                           ("group_by_lecturers", lambda x: x.lecturer.name),
+                           ("group_by_rooms", lambda x: x.room.name)):
+            groups[group] = {}
+            for clas in classes:
+                groups[group].setdefault(key(clas), []).append(clas)
+        return groups
+
+    def migrate(self) -> None:
+        """Chuyển file kết quả định dạng cũ sang định dạng mới"""
+        self.write(self.read())
+
+
+if __name__ == "__main__":
+    ResultStore(*sys.argv[1:2]).migrate()
@@ -1,7 +1,34 @@
 import json
+import os
 import random
+import struct
+import threading
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from array import array
+from collections import Counter, OrderedDict
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from profiling import metrics
+
+
+def derive_rng(seed: Optional[int] = None, *streams) -> random.Random:
+    """Tạo bộ sinh số ngẫu nhiên cho 1 luồng tính toán
+
+    Các luồng có cùng hạt giống gốc nhưng khác tên (vd: "island", 3) là độc
+    lập với nhau và không phụ thuộc vào thứ tự chạy của luồng/tiến trình.
+    Không có hạt giống thì lấy từ hệ điều hành.
+
+     Args:
+        - seed (int): hạt giống gốc
+        - streams: tên của luồng
+
+     Returns:
+        - random.Random: bộ sinh số ngẫu nhiên
+    """
+    if seed is None:
+        return random.Random()
+    return random.Random(":".join(str(part) for part in (seed,) + streams))
 
 
 class Lecturer:
@@ -11,13 +38,21 @@ class Lecturer:
         - minimum (int): Số ca học tối thiểu trong 1 tuần
         - maximum (int): Số ca học tối đa trong 1 tuần
         - name (str): Tên giảng viên
+        - index (int): Chỉ số do Registry cấp (vị trí trong danh sách của ProblemInstance)
+        - unavailable (FrozenSet[Tuple[int, int]]): Các (ngày, mã ca) giảng viên bận
+        - max_classes_per_day (int): Số lớp tối đa trong 1 ngày, None nếu không giới hạn
     """
     minimum = 2
     maximum = 10
+    __slots__ = ("id", "name", "index", "unavailable", "max_classes_per_day")
 
-    def __init__(self, id: str, name: str) -> None:
+    def __init__(self, id: str, name: str, index: int = -1, unavailable: Iterable[Tuple[int, int]] = (),
+                 max_classes_per_day: Optional[int] = None) -> None:
         self.id = id
         self.name = name
+        self.index = index
+        self.unavailable = frozenset((day, shift) for day, shift in unavailable)
+        self.max_classes_per_day = max_classes_per_day
 
     def __str__(self):
         return "<Lecturer: {} {}>".format(self.id, self.name)
@@ -26,15 +61,18 @@ class Lecturer:
         return self.__str__()
 
     @classmethod
-    def read_json(cls, filepath: str) -> List["Lecturer"]:
+    def read_json(cls, filepath: str, registry: Optional["Registry"] = None) -> List["Lecturer"]:
+        registry = registry if registry is not None else Registry()
         lecturers = []
         _lecturers = None
         with open(filepath) as file_json:
             _lecturers = json.load(file_json)
         for _lecturer in _lecturers:
-            lecturer = Lecturer(
+            lecturer = registry.lecturer(
                 id=_lecturer["id"],
                 name=_lecturer["name"],
+                unavailable=[(slot["day"], slot["shift"]) for slot in _lecturer.get("unavailable", ())],
+                max_classes_per_day=_lecturer.get("max_classes_per_day"),
             )
             lecturers.append(lecturer)
         return lecturers
@@ -50,12 +88,24 @@ class Room:
      Attributes:
         - num_shifts: Số ca học trong 1 ngày
         - name: Tên phòng học
+        - index: Chỉ số do Registry cấp (vị trí trong danh sách của ProblemInstance)
+        - capacity: Sức chứa, None nếu không giới hạn
+        - practice: Là phòng thực hành, None thì xác định theo tên (bắt đầu bằng "A")
     """
     num_shifts = 4
+    __slots__ = ("id", "name", "index", "capacity", "practice")
 
-    def __init__(self, id: int, name: str) -> None:
+    def __init__(self, id: int, name: str, index: int = -1, capacity: Optional[int] = None,
+                 practice: Optional[bool] = None) -> None:
         self.id = id
         self.name = name
+        self.index = index
+        self.capacity = capacity
+        self.practice = practice
+
+    @property
+    def is_practice(self) -> bool:
+        return self.practice if self.practice is not None else self.name.startswith("A")
 
     def __str__(self) -> str:
         return "<Room: {}>".format(self.name)
@@ -64,23 +114,27 @@ class Room:
         return self.__str__()
 
     @classmethod
-    def read_json(cls, filepath: str) -> List["Room"]:
+    def read_json(cls, filepath: str, registry: Optional["Registry"] = None) -> List["Room"]:
         """Đọc dữ liệu từ file json
 
          Args:
             filepath (str): file path
+            registry (Registry): bảng đối tượng dùng chung
 
          Returns:
             List[Room]: danh sách lớp học
         """
+        registry = registry if registry is not None else Registry()
         rooms = []
         _rooms = None
         with open(filepath) as file_json:
             _rooms = json.load(file_json)
         for _room in _rooms:
-            room = Room(
+            room = registry.room(
                 id=_room["id"],
                 name=_room["name"],
+                capacity=_room.get("capacity"),
+                practice=_room.get("is_practice"),
             )
             rooms.append(room)
         return rooms
@@ -95,10 +149,15 @@ class Room:
         """
         _rooms = []
         for room in rooms:
-            _rooms.append({
+            _room = {
                 "id": room.id,
                 "name": room.name
-            })
+            }
+            if room.capacity is not None:
+                _room["capacity"] = room.capacity
+            if room.practice is not None:
+                _room["is_practice"] = room.practice
+            _rooms.append(_room)
         with open(filepath, "w") as jsonfile:
             jsonfile.write(json.dumps(_rooms, ensure_ascii=False))
 
@@ -127,11 +186,14 @@ class Shift:
      Attributes:
         - id (int): Mã ca học
         - time (str): thời gian bắt đầu và kết thúc ca
+        - index (int): Chỉ số do Registry cấp (vị trí trong danh sách của ProblemInstance)
     """
+    __slots__ = ("id", "time", "index")
 
-    def __init__(self, id: int, time: str) -> None:
+    def __init__(self, id: int, time: str, index: int = -1) -> None:
         self.id = id
         self.time = time
+        self.index = index
 
     def __str__(self) -> str:
         return "<Shift: {} {}>".format(self.id, self.time)
@@ -140,21 +202,23 @@ class Shift:
         return self.__str__()
 
     @classmethod
-    def read_json(cls, filepath: str) -> List["Shift"]:
+    def read_json(cls, filepath: str, registry: Optional["Registry"] = None) -> List["Shift"]:
         """Đọc dữ liệu từ file json
 
          Args:
             - filepath (str): file path.
+            - registry (Registry): bảng đối tượng dùng chung
 
          Returns:
             - List[Shift]: danh sách ca học
         """
+        registry = registry if registry is not None else Registry()
         shifts = []
         _shifts = None
         with open(filepath) as file_json:
             _shifts = json.load(file_json)
         for _shift in _shifts:
-            shift = Shift(
+            shift = registry.shift(
                 id=_shift["id"],
                 time=_shift["time"],
             )
@@ -180,14 +244,20 @@ class Course:
         - lecturers (List[Lecturer]): Danh sách giảng viên dạy môn học.
         - num_classes (int): Số lớp môn học mở.
         - is_practice (bool): Là lớp thực hành.
+        - index (int): Chỉ số do Registry cấp (vị trí trong danh sách của ProblemInstance).
+        - num_students (int): Số sinh viên của mỗi lớp, None nếu không rõ.
     """
+    __slots__ = ("id", "name", "lecturers", "num_classes", "is_practice", "index", "num_students")
 
-    def __init__(self, id: str, name: str, lecturers: List[Lecturer], num_classes: int, is_practice: bool):
+    def __init__(self, id: str, name: str, lecturers: List[Lecturer], num_classes: int, is_practice: bool, index: int = -1,
+                 num_students: Optional[int] = None):
         self.id = id
         self.name = name
         self.lecturers = lecturers
         self.num_classes = num_classes
         self.is_practice = is_practice
+        self.index = index
+        self.num_students = num_students
 
     def __str__(self):
         return "<Course: id: {} name: {} {}>".format(self.id, self.name, self.lecturers)
@@ -196,23 +266,25 @@ class Course:
         return self.__str__()
 
     @classmethod
-    def read_json(cls, filepath: str) -> List["Course"]:
+    def read_json(cls, filepath: str, registry: Optional["Registry"] = None) -> List["Course"]:
+        registry = registry if registry is not None else Registry()
         courses = []
         _courses = None
         with open(filepath) as file_json:
             _courses = json.load(file_json)
         for _course in _courses:
-            course = Course(
+            course = registry.course(
                 id=_course["id"],
                 name=_course["name"],
                 lecturers=[
-                    Lecturer(
+                    registry.lecturer(
                         id=lecturer["id"],
                         name=lecturer["name"],
                     ) for lecturer in _course["lecturers"]
                 ],
                 num_classes=_course["num_classes"],
                 is_practice=_course["is_practice"],
+                num_students=_course.get("num_students"),
             )
             courses.append(course)
         return courses
@@ -222,8 +294,206 @@ class Course:
         return cls.read_json("./data/courses.json")
 
 
+class Registry:
+    """Bảng đối tượng dùng chung
+
+    Mỗi giảng viên, phòng học, ca học và môn học chỉ được tạo 1 lần theo mã
+    và được cấp chỉ số nguyên theo thứ tự tạo, nên các lớp học tham chiếu tới
+    cùng 1 đối tượng và có thể so sánh bằng `is`. ProblemInstance đặt lại
+    chỉ số theo vị trí trong danh sách của nó; đối tượng chỉ có trong file kết
+    quả (vd: phòng đã bị xoá) giữ chỉ số nằm ngoài các danh sách đó.
+
+    Registry con (có parent) dùng lại đối tượng của registry cha nhưng chỉ
+    ghi đối tượng mới vào chính nó, nên registry cha (vd: ProblemInstance.registry,
+    dùng chung giữa các luồng) không bị thay đổi khi đọc file kết quả.
+    """
+
+    def __init__(self, parent: Optional["Registry"] = None) -> None:
+        self.parent = parent
+        self.lecturers = {}  # type: Dict[str, Lecturer]
+        self.rooms = {}  # type: Dict[int, Room]
+        self.shifts = {}  # type: Dict[int, Shift]
+        self.courses = {}  # type: Dict[str, Course]
+
+    def __get(self, table: str, id: Any) -> Any:
+        entity = getattr(self, table).get(id)
+        if entity is None and self.parent is not None:
+            entity = self.parent.__get(table, id)
+        return entity
+
+    def __next_index(self, table: str) -> int:
+        """Chỉ số tiếp theo, không trùng với chỉ số của registry cha"""
+        return len(getattr(self, table)) + (self.parent.__next_index(table) if self.parent is not None else 0)
+
+    def lecturer(self, id: str, name: str, unavailable: Iterable[Tuple[int, int]] = (),
+                 max_classes_per_day: Optional[int] = None) -> Lecturer:
+        lecturer = self.__get("lecturers", id)
+        if lecturer is None:
+            lecturer = Lecturer(id, name, self.__next_index("lecturers"), unavailable, max_classes_per_day)
+            self.lecturers[id] = lecturer
+        return lecturer
+
+    def room(self, id: int, name: str, capacity: Optional[int] = None, practice: Optional[bool] = None) -> Room:
+        room = self.__get("rooms", id)
+        if room is None:
+            room = Room(id, name, self.__next_index("rooms"), capacity, practice)
+            self.rooms[id] = room
+        return room
+
+    def shift(self, id: int, time: str) -> Shift:
+        shift = self.__get("shifts", id)
+        if shift is None:
+            shift = Shift(id, time, self.__next_index("shifts"))
+            self.shifts[id] = shift
+        return shift
+
+    def course(self, id: str, name: str, lecturers: Optional[List[Lecturer]], num_classes: int, is_practice: bool,
+               num_students: Optional[int] = None) -> Course:
+        course = self.__get("courses", id)
+        if course is None:
+            course = Course(id, name, lecturers, num_classes, is_practice, self.__next_index("courses"), num_students)
+            self.courses[id] = course
+        return course
+
+
+class ProblemInstance:
+    """Dữ liệu bài toán đã được biên dịch
+
+    Được đọc 1 lần từ thư mục dữ liệu và dùng chung cho Schedule, Population
+    và GeneticAlgorithm. ProblemInstance.load() chỉ đọc lại khi thời gian sửa
+    đổi của các file dữ liệu thay đổi.
+
+     Attributes:
+        - courses, rooms, lecturers, shifts: dữ liệu gốc, lecturers có thêm các giảng viên chỉ có trong courses.json
+        - catalogue_lecturers: Danh sách giảng viên của lecturers.json
+        - rooms_practice: Danh sách phòng thực hành
+        - rooms_npractice: Danh sách phòng không thực hành
+        - class_courses: Môn học của từng lớp theo thứ tự mã lớp
+        - registry: Bảng đối tượng dùng chung của bộ dữ liệu, không thay đổi sau khi tạo;
+          truyền cho Schedule.load để lịch học đã lưu dùng chung đối tượng với dữ liệu bài toán
+        - fitness_cache: Bộ nhớ đệm độ thích nghi của các lịch học trên bộ dữ liệu này
+        - constraints: Các ràng buộc đã biên dịch với trọng số mặc định (constraints.ConstraintSet),
+          chỉ biên dịch 1 lần khi được dùng lần đầu
+    """
+    FILES = ("courses.json", "rooms.json", "lecturers.json", "shifts.json")
+
+    __cache = {}  # type: Dict[str, Tuple[Tuple[float, ...], "ProblemInstance"]]
+
+    def __init__(self, courses: List[Course], rooms: List[Room], lecturers: List[Lecturer], shifts: List[Shift], registry: Optional[Registry] = None) -> None:
+        self.registry = registry if registry is not None else Registry()
+        self.fitness_cache = FitnessCache()
+        self.__constraints = None
+        self.courses = courses
+        self.rooms = rooms
+        self.catalogue_lecturers = list(lecturers)
+        self.lecturers = list(lecturers)
+        self.shifts = shifts
+
+        self.rooms_practice = [room for room in rooms if room.is_practice]
+        self.rooms_npractice = [room for room in rooms if not room.is_practice]
+        self.class_courses = [course for course in courses for _ in range(course.num_classes)]
+
+        lecturer_ids = {lecturer.id for lecturer in self.lecturers}
+        for course in courses:
+            for lecturer in course.lecturers:
+                if lecturer.id not in lecturer_ids:
+                    lecturer_ids.add(lecturer.id)
+                    self.lecturers.append(lecturer)
+        # Chỉ số của đối tượng là vị trí trong danh sách, dùng trong Class.key và encode
+        for entities in (courses, rooms, shifts, self.lecturers):
+            for i, entity in enumerate(entities):
+                entity.index = i
+
+    @property
+    def num_classes(self) -> int:
+        return len(self.class_courses)
+
+    @property
+    def constraints(self) -> "ConstraintSet":
+        if self.__constraints is None:
+            from constraints import ConstraintSet
+            self.__constraints = ConstraintSet.compile(self)
+        return self.__constraints
+
+    def encode(self, classes: List["Class"]) -> bytes:
+        """Mã hoá gene thành dãy số nguyên (ngày, ca, phòng, giảng viên) của từng lớp"""
+        return self.encode_keys([clas.key() for clas in classes])
+
+    @staticmethod
+    def encode_keys(keys: List[Tuple[int, int, int, int]]) -> bytes:
+        """Mã hoá Class.key() của từng lớp giống ProblemInstance.encode"""
+        return struct.pack("{}i".format(4 * len(keys)), *chain.from_iterable(keys))
+
+    @staticmethod
+    def decode_keys(encoded: bytes) -> List[Tuple[int, int, int, int]]:
+        """Giải mã dãy số nguyên của ProblemInstance.encode thành khoá của từng lớp"""
+        genes = array("i")
+        genes.frombytes(encoded)
+        return [tuple(genes[i:i + 4]) for i in range(0, len(genes), 4)]
+
+    def sample_class(self, class_id: int, rng: Optional[random.Random] = None) -> "Class":
+        """Sinh ngẫu nhiên 1 cách xếp hợp lệ cho lớp thứ `class_id`
+
+        Mặc định dùng bộ sinh số ngẫu nhiên chung của module random.
+        """
+        rng = rng if rng is not None else random
+        course = self.class_courses[class_id]
+        new_class = Class(class_id, course)
+        new_class.shift = self.shifts[rng.randrange(0, len(self.shifts))]
+        if course.is_practice:
+            new_class.room = self.rooms_practice[rng.randrange(0, len(self.rooms_practice))]
+        else:
+            new_class.room = self.rooms_npractice[rng.randrange(0, len(self.rooms_npractice))]
+        new_class.day = rng.randrange(0, len(Class.DAYS))
+        new_class.lecturer = course.lecturers[rng.randrange(0, len(course.lecturers))]
+        return new_class
+
+    def decode(self, encoded: bytes) -> List["Class"]:
+        """Giải mã dãy số nguyên của ProblemInstance.encode thành danh sách lớp học"""
+        return [
+            Class(class_id, course, self.lecturers[lecturer], self.rooms[room], day, self.shifts[shift])
+            for (class_id, course), (day, shift, room, lecturer)
+            in zip(enumerate(self.class_courses), self.decode_keys(encoded))
+        ]
+
+    @classmethod
+    def read_json(cls, data_dir: str) -> "ProblemInstance":
+        """Đọc dữ liệu bài toán từ thư mục
+
+         Args:
+            - data_dir (str): thư mục chứa courses.json, rooms.json, lecturers.json, shifts.json
+
+         Returns:
+            - ProblemInstance: dữ liệu bài toán
+        """
+        registry = Registry()
+        lecturers = Lecturer.read_json(os.path.join(data_dir, "lecturers.json"), registry)
+        rooms = Room.read_json(os.path.join(data_dir, "rooms.json"), registry)
+        shifts = Shift.read_json(os.path.join(data_dir, "shifts.json"), registry)
+        courses = Course.read_json(os.path.join(data_dir, "courses.json"), registry)
+        return cls(courses=courses, rooms=rooms, lecturers=lecturers, shifts=shifts, registry=registry)
+
+    @classmethod
+    def load(cls, data_dir: str = "./data") -> "ProblemInstance":
+        """Lấy dữ liệu bài toán đã lưu, đọc lại nếu file dữ liệu thay đổi
+
+         Args:
+            - data_dir (str): thư mục dữ liệu
+
+         Returns:
+            - ProblemInstance: dữ liệu bài toán
+        """
+        key = os.path.abspath(data_dir)
+        mtimes = tuple(os.stat(os.path.join(data_dir, filename)).st_mtime_ns for filename in cls.FILES)
+        cached = cls.__cache.get(key)
+        if cached is None or cached[0] != mtimes:
+            cached = (mtimes, cls.read_json(data_dir))
+            cls.__cache[key] = cached
+        return cached[1]
+
+
 class Gene(ABC):
-    pass
+    __slots__ = ()
 
 
 class Class(Gene):
@@ -244,6 +514,7 @@ class Class(Gene):
         4: "Thứ 6",
         5: "Thứ 7",
     }
+    __slots__ = ("id", "course", "lecturer", "room", "day", "shift", "conflict")
 
     def __init__(self, id: int, course: Course, lecturer: Optional[Lecturer] = None, room: Optional[Room] = None, day: Optional[int] = None, shift: Optional[Shift] = None, conflict: Optional[bool] = False):
         self.id = id
@@ -270,6 +541,280 @@ class Class(Gene):
             self.shift,
         )
 
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "course": {
+                "id": self.course.id,
+                "name": self.course.name,
+                "num_classes": self.course.num_classes,
+                "is_practice": self.course.is_practice,
+            },
+            "room": {
+                "id": self.room.id,
+                "name": self.room.name,
+            },
+            "lecturer": {
+                "id": self.lecturer.id,
+                "name": self.lecturer.name,
+            },
+            "day": self.day,
+            "shift": {
+                "id": self.shift.id,
+                "time": self.shift.time,
+            },
+            "conflict": self.conflict,
+        }
+
+    def key(self) -> Tuple[int, int, int, int]:
+        """Khoá dùng cho chỉ mục xung đột: (ngày, chỉ số ca, chỉ số phòng, chỉ số giảng viên)"""
+        return (self.day, self.shift.index, self.room.index, self.lecturer.index)
+
+
+class ConflictIndex:
+    """Chỉ mục xung đột
+
+    Gom các lớp theo (ngày, ca, phòng) và (ngày, ca, giảng viên) thay cho việc
+    so sánh từng cặp lớp. Khi một gene thay đổi chỉ những nhóm chứa gene đó
+    được cập nhật nên số xung đột, cờ xung đột và điểm phạt của các ràng buộc
+    được tính lại trong O(1) (theo kích thước nhóm).
+
+     Attributes:
+        - keys: (ngày, ca, phòng, giảng viên) của từng lớp
+        - constraints: Các ràng buộc và trọng số (constraints.ConstraintSet)
+        - flags: cờ xung đột của từng lớp
+        - num_conflicts: Số cặp lớp bị trùng phòng hoặc trùng giảng viên
+        - penalties: Điểm phạt của từng ràng buộc trong constraints.unary + constraints.grouped
+    """
+
+    def __init__(self, keys: Iterable[Tuple[int, int, int, int]], constraints: "ConstraintSet") -> None:
+        self.keys = list(keys)
+        self.constraints = constraints
+        self.flags = [False] * len(self.keys)
+        self.num_conflicts = 0
+        self.__unary = [constraint for constraint, _ in constraints.unary]
+        self.__grouped = [constraint for constraint, _ in constraints.grouped]
+        self.__weights = [weight for _, weight in constraints.unary + constraints.grouped]
+        self.penalties = [0] * len(self.__weights)
+        self.__rooms = {}  # type: Dict[Tuple, Set[int]]
+        self.__lecturers = {}  # type: Dict[Tuple, Set[int]]
+        self.__pairs = {}  # type: Dict[Tuple, int]
+        self.__counts = []  # type: List[Counter]
+        for i, key in enumerate(self.keys):
+            self.__insert_conflicts(i, key)
+        # Điểm phạt ban đầu được tính 1 lần cho mọi lớp thay vì cộng dồn từng lớp
+        k = 0
+        for constraint in self.__unary:
+            self.penalties[k] = sum(map(constraint.penalty, range(len(self.keys)), self.keys))
+            k += 1
+        for constraint in self.__grouped:
+            counts = Counter(map(constraint.group, range(len(self.keys)), self.keys))
+            counts.pop(None, None)
+            self.__counts.append(counts)
+            self.penalties[k] = sum(constraint.loss(group, count) for group, count in counts.items())
+            k += 1
+        for i in range(len(self.keys)):
+            self.flags[i] = self.__flag(i)
+
+    def fitness(self) -> float:
+        return self.constraints.fitness(self.num_conflicts, self.penalties)
+
+    def named_penalties(self) -> Dict[str, int]:
+        """Điểm phạt theo tên ràng buộc"""
+        terms = self.constraints.unary + self.constraints.grouped
+        return {constraint.name: penalty for (constraint, _), penalty in zip(terms, self.penalties)}
+
+    def is_conflicted(self, i: int) -> bool:
+        """Lớp thứ i có trùng phòng hoặc trùng giảng viên với lớp nào khác không"""
+        day, shift, room, lecturer = self.keys[i]
+        return len(self.__rooms[(day, shift, room)]) > 1 \
+            or len(self.__lecturers[(day, shift, lecturer)]) > 1
+
+    def is_violated(self, i: int) -> bool:
+        """Lớp thứ i bị xung đột hoặc bị phạt bởi 1 ràng buộc trên từng lớp"""
+        if self.is_conflicted(i):
+            return True
+        key = self.keys[i]
+        return any(constraint.penalty(i, key) for constraint in self.__unary)
+
+    def delta(self, i: int, key: Tuple[int, int, int, int]) -> Tuple[int, float]:
+        """Độ thay đổi (số xung đột, chi phí) nếu thay khoá của lớp thứ i
+
+        Chi phí là mẫu số của độ thích nghi trừ 1 (số xung đột và điểm phạt
+        nhân trọng số), giảm chi phí là tăng độ thích nghi. Chỉ xét các nhóm
+        chứa khoá cũ và khoá mới, không thay đổi chỉ mục.
+        """
+        old_key = self.keys[i]
+        if key == old_key:
+            return 0, 0.0
+        day, shift, room, lecturer = old_key
+        removed = len(self.__rooms[(day, shift, room)]) - 1 \
+            + len(self.__lecturers[(day, shift, lecturer)]) - 1 \
+            - (self.__pairs[old_key] - 1)
+
+        _day, _shift, _room, _lecturer = key
+        same_room = (_day, _shift, _room) == (day, shift, room)
+        same_lecturer = (_day, _shift, _lecturer) == (day, shift, lecturer)
+        added = len(self.__rooms.get((_day, _shift, _room), ())) - same_room \
+            + len(self.__lecturers.get((_day, _shift, _lecturer), ())) - same_lecturer \
+            - self.__pairs.get(key, 0)
+
+        num_conflicts = added - removed
+        cost = num_conflicts * self.constraints.conflicts_weight
+        k = 0
+        for constraint in self.__unary:
+            cost += (constraint.penalty(i, key) - constraint.penalty(i, old_key)) * self.__weights[k]
+            k += 1
+        for constraint, counts in zip(self.__grouped, self.__counts):
+            group = constraint.group(i, old_key)
+            _group = constraint.group(i, key)
+            if group != _group:
+                penalty = 0
+                if group is not None:
+                    count = counts[group]
+                    penalty += constraint.loss(group, count - 1) - constraint.loss(group, count)
+                if _group is not None:
+                    count = counts.get(_group, 0)
+                    penalty += constraint.loss(_group, count + 1) - constraint.loss(_group, count)
+                cost += penalty * self.__weights[k]
+            k += 1
+        return num_conflicts, cost
+
+    def update(self, i: int, key: Tuple[int, int, int, int]) -> List[int]:
+        """Thay khoá của lớp thứ i
+
+         Args:
+            - i (int): vị trí gene
+            - key (Tuple): khoá mới
+
+         Returns:
+            - List[int]: các vị trí có cờ xung đột cần cập nhật lại
+        """
+        old_key = self.keys[i]
+        affected = set(self.__rooms[old_key[:3]])
+        affected.update(self.__lecturers[(old_key[0], old_key[1], old_key[3])])
+        self.__remove(i, old_key)
+        self.keys[i] = key
+        self.__insert(i, key)
+        affected.update(self.__rooms[key[:3]])
+        affected.update(self.__lecturers[(key[0], key[1], key[3])])
+        for j in affected:
+            self.flags[j] = self.__flag(j)
+        return list(affected)
+
+    def __insert_conflicts(self, i: int, key: Tuple[int, int, int, int]) -> None:
+        day, shift, room, lecturer = key
+        rooms = self.__rooms.setdefault((day, shift, room), set())
+        lecturers = self.__lecturers.setdefault((day, shift, lecturer), set())
+        pairs = self.__pairs.get(key, 0)
+        self.num_conflicts += len(rooms) + len(lecturers) - pairs
+        rooms.add(i)
+        lecturers.add(i)
+        self.__pairs[key] = pairs + 1
+
+    def __insert(self, i: int, key: Tuple[int, int, int, int]) -> None:
+        self.__insert_conflicts(i, key)
+        k = 0
+        for constraint in self.__unary:
+            self.penalties[k] += constraint.penalty(i, key)
+            k += 1
+        for constraint, counts in zip(self.__grouped, self.__counts):
+            group = constraint.group(i, key)
+            if group is not None:
+                count = counts.get(group, 0)
+                self.penalties[k] += constraint.loss(group, count + 1) - constraint.loss(group, count)
+                counts[group] = count + 1
+            k += 1
+
+    def __remove(self, i: int, key: Tuple[int, int, int, int]) -> None:
+        day, shift, room, lecturer = key
+        rooms = self.__rooms[(day, shift, room)]
+        lecturers = self.__lecturers[(day, shift, lecturer)]
+        rooms.discard(i)
+        lecturers.discard(i)
+        self.__pairs[key] -= 1
+        self.num_conflicts -= len(rooms) + len(lecturers) - self.__pairs[key]
+
+        k = 0
+        for constraint in self.__unary:
+            self.penalties[k] -= constraint.penalty(i, key)
+            k += 1
+        for constraint, counts in zip(self.__grouped, self.__counts):
+            group = constraint.group(i, key)
+            if group is not None:
+                count = counts[group]
+                self.penalties[k] += constraint.loss(group, count - 1) - constraint.loss(group, count)
+                counts[group] = count - 1
+            k += 1
+
+    def __flag(self, i: int) -> bool:
+        # Giống phép so sánh từng cặp: lớp i bị đánh dấu khi có lớp j > i trùng với nó
+        day, shift, room, lecturer = self.keys[i]
+        return max(self.__rooms[(day, shift, room)]) > i \
+            or max(self.__lecturers[(day, shift, lecturer)]) > i
+
+
+class FitnessCache:
+    """Bộ nhớ đệm LRU cho kết quả tính độ thích nghi
+
+    Khoá là (ConstraintSet.key, gene đã mã hoá của tất cả các lớp)
+    (Schedule.fitness_key) chứ không phải giá trị băm của nó, nên 2 lịch học
+    có cùng cách xếp (cá thể ưu tú, con trùng nhau) chỉ được tính 1 lần, các
+    lần chạy với trọng số khác nhau không dùng nhầm kết quả của nhau và không
+    có đụng độ giá trị băm.
+
+     Attributes:
+        - maxsize (int): Số kết quả tối đa được giữ lại, 0 để tắt
+        - hits (int): Số lần tìm thấy trong bộ nhớ đệm
+        - misses (int): Số lần phải tính lại
+    """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()  # type: OrderedDict[Tuple[tuple, bytes], Tuple[int, float, bytes]]
+        self.__lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def get(self, key: Tuple[tuple, bytes]) -> Optional[Tuple[int, float, bytes]]:
+        """(số xung đột, độ thích nghi, cờ xung đột) đã lưu của `key`, None nếu chưa có"""
+        with self.__lock:
+            value = self.__entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Tuple[tuple, bytes], value: Tuple[int, float, bytes]) -> None:
+        with self.__lock:
+            self.__entries[key] = value
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.maxsize:
+                self.__entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self.__lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self.__entries),
+                "maxsize": self.maxsize,
+            }
+
 
 class Chromosome:
     genes = []
@@ -294,51 +839,85 @@ class Schedule(Chromosome):
     """Lịch học
 
      Attributes:
-        - __shifts: Danh sách các ca học
-        - __rooms: Danh sách các phòng học
+        - problem: Dữ liệu bài toán
+        - rng: Bộ sinh số ngẫu nhiên dùng khi khởi tạo
+        - constraints: Các ràng buộc và trọng số dùng để tính độ thích nghi, mặc định problem.constraints
 
         - classes: Danh sách các lớp học
         - __num_conflicts: Số lần bị trùng
         - __fitness: Độ thích nghi
 
     """
-    __shifts = Shift.load()
-    __rooms = Room.load()  # type: List[Room]
-    __lecturers = Lecturer.load()
 
-    def __init__(self) -> None:
+    def __init__(self, problem: Optional[ProblemInstance] = None, rng: Optional[random.Random] = None,
+                 constraints: Optional["ConstraintSet"] = None) -> None:
+        self.problem = problem if problem is not None else ProblemInstance.load()
+        self.rng = rng if rng is not None else random
+        self.constraints = constraints if constraints is not None else self.problem.constraints
         self.classes = []  # type: List[Class]
         self.genes = self.classes
         self.__num_conflicts = 0
         self.__fitness = -1
+        self.conflict_index = None  # type: Optional[ConflictIndex]
 
     def copy(self) -> "Schedule":
-        schedule = Schedule()
+        schedule = Schedule(self.problem, self.rng, self.constraints)
         for clas in self.classes: schedule.classes.append(clas.copy())
         return schedule
 
+    @metrics.timed("initialize")
     def initialize(self) -> "Schedule":
-        _rooms_practice = [
-            room for room in self.__rooms if room.name.startswith("A")]
-        _rooms_npractice = [
-            room for room in self.__rooms if not room.name.startswith("A")]
-
-        _class_id = 0
-        courses = Course.load()
-        for i in range(len(courses)):
-            for _ in range(courses[i].num_classes):
-                new_class = Class(_class_id, courses[i])
-                _class_id += 1
-                new_class.shift = self.__shifts[random.randrange(
-                    0, len(self.__shifts))]
-                if courses[i].is_practice:
-                    new_class.room = _rooms_practice[random.randrange(0, len(_rooms_practice))]
-                else:
-                    new_class.room = _rooms_npractice[random.randrange(0, len(_rooms_npractice))]
-                new_class.day = random.randrange(0, len(Class.DAYS))
-                new_class.lecturer = courses[i].lecturers[random.randrange(
-                    0, len(courses[i].lecturers))]
-                self.classes.append(new_class)
+        for class_id in range(self.problem.num_classes):
+            self.classes.append(self.problem.sample_class(class_id, self.rng))
+        return self
+
+    @metrics.timed("initialize_greedy")
+    def initialize_greedy(self) -> "Schedule":
+        """Khởi tạo tham lam: xếp lần lượt từng lớp vào chỗ còn trống
+
+        Các lớp được xét theo thứ tự ngẫu nhiên. Với mỗi lớp, thử các (ngày, ca)
+        theo thứ tự ngẫu nhiên, chọn giảng viên còn rảnh đang dạy ít lớp nhất
+        và 1 phòng còn trống ngẫu nhiên, dựa trên bảng phòng trống theo
+        (ngày, ca) và bảng (ngày, ca, giảng viên) đã bận. Lớp không còn chỗ
+        trống được xếp ngẫu nhiên như initialize().
+        """
+        problem = self.problem
+        rng = self.rng
+        slots = [(day, shift) for day in range(len(Class.DAYS)) for shift in problem.shifts]
+        free_rooms = {}  # type: Dict[Tuple[int, int, bool], List[Room]]
+        busy_lecturers = set()  # type: Set[Tuple[int, int, str]]
+        loads = {}  # type: Dict[str, int]
+
+        classes = [None] * problem.num_classes  # type: List[Optional[Class]]
+        order = list(range(problem.num_classes))
+        rng.shuffle(order)
+        for class_id in order:
+            course = problem.class_courses[class_id]
+            lecturers = list(course.lecturers)
+            rng.shuffle(lecturers)
+            rng.shuffle(slots)
+            for day, shift in slots:
+                available = [lecturer for lecturer in lecturers if (day, shift.id, lecturer.id) not in busy_lecturers]
+                if not available:
+                    continue
+                rooms = free_rooms.get((day, shift.id, course.is_practice))
+                if rooms is None:
+                    rooms = list(problem.rooms_practice if course.is_practice else problem.rooms_npractice)
+                    free_rooms[(day, shift.id, course.is_practice)] = rooms
+                if not rooms:
+                    continue
+                i = rng.randrange(len(rooms))
+                room = rooms[i]
+                rooms[i] = rooms[-1]
+                rooms.pop()
+                lecturer = min(available, key=lambda x: loads.get(x.id, 0))
+                busy_lecturers.add((day, shift.id, lecturer.id))
+                loads[lecturer.id] = loads.get(lecturer.id, 0) + 1
+                classes[class_id] = Class(class_id, course, lecturer, room, day, shift)
+                break
+            else:
+                classes[class_id] = problem.sample_class(class_id, rng)
+        self.classes.extend(classes)
         return self
 
     def get_fitness(self) -> float:
@@ -347,258 +926,83 @@ class Schedule(Chromosome):
     def get_num_conflicts(self) -> int:
         return self.__num_conflicts
 
+    @metrics.timed("calculate_fitness")
     def calculate_fitness(self) -> float:
-        self.__num_conflicts = 0
-        classes = self.classes
-        for i in range(len(classes)-1):
-            for j in range(i+1, len(classes)):
-                if classes[i].day == classes[j].day \
-                        and classes[i].shift == classes[j].shift:
-                    if classes[i].room.id == classes[j].room.id:
-                        self.__num_conflicts += 1
-                        classes[i].conflict = True
-                    elif classes[i].lecturer.id == classes[j].lecturer.id:
-                        self.__num_conflicts += 1
-                        classes[i].conflict = True
-
-        loss = 0
-
-        num_class_per_lecturer = {}
-        for i in range(len(classes)):
-            if classes[i].lecturer.id not in num_class_per_lecturer:
-                num_class_per_lecturer[classes[i].lecturer.id] = 0
-            else:
-                num_class_per_lecturer[classes[i].lecturer.id] += 1
-
-        for lecturer in num_class_per_lecturer:
-            if num_class_per_lecturer[lecturer] > Lecturer.maximum:
-                loss += num_class_per_lecturer[lecturer] - Lecturer.maximum
-            if num_class_per_lecturer[lecturer] < Lecturer.minimum:
-                loss += Lecturer.minimum - num_class_per_lecturer[lecturer]
-        self.__fitness = 1 / (self.__num_conflicts * 0.1 + loss * 0.01 + 1)
+        """Tính độ thích nghi, dùng kết quả trong problem.fitness_cache nếu có
+
+        Khi lấy từ bộ nhớ đệm, conflict_index không được dựng (None), dùng
+        build_conflict_index() nếu cần chỉ mục xung đột.
+        """
+        cache = self.problem.fitness_cache
+        if not cache.enabled:
+            return self.build_conflict_index()
+        keys = [clas.key() for clas in self.classes]
+        key = (self.constraints.key, ProblemInstance.encode_keys(keys))
+        cached = cache.get(key)
+        if cached is not None:
+            num_conflicts, fitness, flags = cached
+            self.set_fitness(num_conflicts, fitness, [bool(flag) for flag in flags])
+            return fitness
+        self.build_conflict_index(keys)
+        cache.put(key, (self.__num_conflicts, self.__fitness, bytes(self.conflict_index.flags)))
         return self.__fitness
 
-    def save(self):
-        data = {}
-        courses = {}
-        lecturers = {}
-        rooms = {}
-        _classes = []
-        for clas in self.classes:
-            _classes.append({
-                "id": clas.id,
-                "course": {
-                    "id": clas.course.id,
-                    "name": clas.course.name,
-                    "num_classes": clas.course.num_classes,
-                    "is_practice": clas.course.is_practice,
-                },
-                "room": {
-                    "id": clas.room.id,
-                    "name": clas.room.name,
-                },
-                "lecturer": {
-                    "id": clas.lecturer.id,
-                    "name": clas.lecturer.name,
-                },
-                "day": clas.day,
-                "shift": {
-                    "id": clas.shift.id,
-                    "time": clas.shift.time,
-                },
-                "conflict": clas.conflict,
-            })
-
-        for clas in self.classes:
-            if clas.course.name not in courses:
-                courses[clas.course.name] = [{
-                    "id": clas.id,
-                    "course": {
-                        "id": clas.course.id,
-                        "name": clas.course.name,
-                        "num_classes": clas.course.num_classes,
-                        "is_practice": clas.course.is_practice,
-                    },
-                    "room": {
-                        "id": clas.room.id,
-                        "name": clas.room.name,
-                    },
-                    "lecturer": {
-                        "id": clas.lecturer.id,
-                        "name": clas.lecturer.name,
-                    },
-                    "day": clas.day,
-                    "shift": {
-                        "id": clas.shift.id,
-                        "time": clas.shift.time,
-                    },
-                    "conflict": clas.conflict,
-                }]
-            else:
-                courses[clas.course.name].append({
-                    "id": clas.id,
-                    "course": {
-                        "id": clas.course.id,
-                        "name": clas.course.name,
-                        "num_classes": clas.course.num_classes,
-                        "is_practice": clas.course.is_practice,
-                    },
-                    "room": {
-                        "id": clas.room.id,
-                        "name": clas.room.name,
-                    },
-                    "lecturer": {
-                        "id": clas.lecturer.id,
-                        "name": clas.lecturer.name,
-                    },
-                    "day": clas.day,
-                    "shift": {
-                        "id": clas.shift.id,
-                        "time": clas.shift.time,
-                    },
-                    "conflict": clas.conflict,
-                })
-
-            if clas.lecturer.name not in lecturers:
-                lecturers[clas.lecturer.name] = [{
-                    "id": clas.id,
-                    "course": {
-                        "id": clas.course.id,
-                        "name": clas.course.name,
-                        "num_classes": clas.course.num_classes,
-                        "is_practice": clas.course.is_practice,
-                    },
-                    "room": {
-                        "id": clas.room.id,
-                        "name": clas.room.name,
-                    },
-                    "lecturer": {
-                        "id": clas.lecturer.id,
-                        "name": clas.lecturer.name,
-                    },
-                    "day": clas.day,
-                    "shift": {
-                        "id": clas.shift.id,
-                        "time": clas.shift.time,
-                    },
-                    "conflict": clas.conflict,
-                }]
-            else:
-                lecturers[clas.lecturer.name].append({
-                    "id": clas.id,
-                    "course": {
-                        "id": clas.course.id,
-                        "name": clas.course.name,
-                        "num_classes": clas.course.num_classes,
-                        "is_practice": clas.course.is_practice,
-                    },
-                    "room": {
-                        "id": clas.room.id,
-                        "name": clas.room.name,
-                    },
-                    "lecturer": {
-                        "id": clas.lecturer.id,
-                        "name": clas.lecturer.name,
-                    },
-                    "day": clas.day,
-                    "shift": {
-                        "id": clas.shift.id,
-                        "time": clas.shift.time,
-                    },
-                    "conflict": clas.conflict,
-                })
-
-            if clas.room.name not in rooms:
-                rooms[clas.room.name] = [{
-                    "id": clas.id,
-                    "course": {
-                        "id": clas.course.id,
-                        "name": clas.course.name,
-                        "num_classes": clas.course.num_classes,
-                        "is_practice": clas.course.is_practice,
-                    },
-                    "room": {
-                        "id": clas.room.id,
-                        "name": clas.room.name,
-                    },
-                    "lecturer": {
-                        "id": clas.lecturer.id,
-                        "name": clas.lecturer.name,
-                    },
-                    "day": clas.day,
-                    "shift": {
-                        "id": clas.shift.id,
-                        "time": clas.shift.time,
-                    },
-                    "conflict": clas.conflict,
-                }]
-            else:
-                rooms[clas.room.name].append({
-                    "id": clas.id,
-                    "course": {
-                        "id": clas.course.id,
-                        "name": clas.course.name,
-                        "num_classes": clas.course.num_classes,
-                        "is_practice": clas.course.is_practice,
-                    },
-                    "room": {
-                        "id": clas.room.id,
-                        "name": clas.room.name,
-                    },
-                    "lecturer": {
-                        "id": clas.lecturer.id,
-                        "name": clas.lecturer.name,
-                    },
-                    "day": clas.day,
-                    "shift": {
-                        "id": clas.shift.id,
-                        "time": clas.shift.time,
-                    },
-                    "conflict": clas.conflict,
-                })
-        data = {
-            "group_by_courses": courses,
-            "group_by_lecturers": lecturers,
-            "group_by_rooms": rooms,
-            "classes": _classes
-        }
-        with open("data/results.json", "w") as jsonfile:
-            jsonfile.write(json.dumps(data, ensure_ascii=False))
+    def fitness_key(self) -> Tuple[tuple, bytes]:
+        """Khoá của lịch học trong FitnessCache: (ConstraintSet.key, ProblemInstance.encode)"""
+        return (self.constraints.key, self.problem.encode(self.classes))
+
+    def build_conflict_index(self, keys: Optional[List[Tuple[int, int, int, int]]] = None) -> float:
+        """Dựng lại chỉ mục xung đột và tính độ thích nghi từ đầu (không dùng bộ nhớ đệm)"""
+        self.conflict_index = ConflictIndex(keys if keys is not None else (clas.key() for clas in self.classes),
+                                            self.constraints)
+        for clas, flag in zip(self.classes, self.conflict_index.flags):
+            clas.conflict = flag
+        self.__num_conflicts = self.conflict_index.num_conflicts
+        self.__fitness = self.conflict_index.fitness()
+        return self.__fitness
+
+    def penalties(self) -> Dict[str, int]:
+        """Điểm phạt của từng ràng buộc đang được tính (theo tên)"""
+        if self.conflict_index is None:
+            self.build_conflict_index()
+        return self.conflict_index.named_penalties()
+
+    def set_fitness(self, num_conflicts: int, fitness: float, flags: List[bool]) -> None:
+        """Gán kết quả tính độ thích nghi từ bên ngoài (vd: tiến trình khác)"""
+        self.conflict_index = None
+        for clas, flag in zip(self.classes, flags):
+            clas.conflict = flag
+        self.__num_conflicts = num_conflicts
+        self.__fitness = fitness
+
+    def replace_gene(self, i: int, clas: Class) -> float:
+        """Thay gene thứ i và cập nhật độ thích nghi bằng chỉ mục xung đột
+
+         Args:
+            - i (int): vị trí gene
+            - clas (Class): lớp học mới
+
+         Returns:
+            - float: độ thích nghi mới
+        """
+        self.classes[i] = clas
+        if self.conflict_index is None:
+            return self.build_conflict_index()
+        for j in self.conflict_index.update(i, clas.key()):
+            self.classes[j].conflict = self.conflict_index.flags[j]
+        self.__num_conflicts = self.conflict_index.num_conflicts
+        self.__fitness = self.conflict_index.fitness()
+        return self.__fitness
+
+    @metrics.timed("save")
+    def save(self, filepath: str = "./data/results.json") -> None:
+        from result_store import ResultStore
+        ResultStore(filepath).write(self.classes)
 
     @classmethod
-    def load(cls):
-        _result = None
-        with open("./data/results.json") as file_json:
-            _result = json.load(file_json)
-
-        classes = []
-
-        for clas in _result["classes"]:
-            classes.append(Class(
-                id=clas["id"],
-                course=Course(
-                    id=clas["course"]["id"],
-                    name=clas["course"]["name"],
-                    lecturers=None,
-                    is_practice=clas["course"]["is_practice"],
-                    num_classes=clas["course"]["num_classes"]
-                ),
-                lecturer=Lecturer(
-                    id=clas["lecturer"]["id"],
-                    name=clas["lecturer"]["name"],
-                ),
-                room=Room(
-                    id=clas["room"]["id"],
-                    name=clas["room"]["name"]
-                ),
-                day=clas["day"],
-                shift=Shift(
-                    id=clas["shift"]["id"],
-                    time=clas["shift"]["time"]
-                ),
-                conflict = clas["conflict"]
-            ))
-        return classes
+    def load(cls, filepath: str = "./data/results.json", registry: Optional[Registry] = None) -> List[Class]:
+        from result_store import ResultStore
+        return ResultStore(filepath).read(registry)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,191 @@
+import json
+import os
+import random
+from collections import Counter
+
+import pytest
+
+from benchmark import generate_instance
+from constraints import ConstraintSet, parse_weights
+from genetic_algorithm import RunConfig
+from schedule import Lecturer, ProblemInstance, Schedule
+
+
+def brute_force(classes):
+    """Số xung đột và cờ xung đột theo cách so sánh từng cặp lớp"""
+    num_conflicts = 0
+    flags = [False] * len(classes)
+    for i in range(len(classes)):
+        for j in range(i + 1, len(classes)):
+            a, b = classes[i], classes[j]
+            if a.day == b.day and a.shift is b.shift and (a.room is b.room or a.lecturer is b.lecturer):
+                num_conflicts += 1
+                flags[i] = True
+    return num_conflicts, flags
+
+
+def lecturer_load(classes):
+    loss = 0
+    for count in Counter(clas.lecturer.id for clas in classes).values():
+        loss += max(0, count - Lecturer.maximum) + max(0, Lecturer.minimum - count)
+    return loss
+
+
+def cost(fitness):
+    return 1 / fitness - 1
+
+
+@pytest.fixture(scope="module")
+def problem(tmp_path_factory):
+    data_dir = str(tmp_path_factory.mktemp("plain"))
+    generate_instance(data_dir, 30, 12, 15, seed=0)
+    return ProblemInstance.read_json(data_dir)
+
+
+@pytest.fixture(scope="module")
+def constrained_problem(tmp_path_factory):
+    """Bộ dữ liệu có thông tin cho mọi ràng buộc đã đăng ký"""
+    data_dir = str(tmp_path_factory.mktemp("constrained"))
+    generate_instance(data_dir, 30, 12, 15, seed=1)
+
+    def rewrite(filename, update):
+        path = os.path.join(data_dir, filename)
+        with open(path) as file_json:
+            data = json.load(file_json)
+        for i, item in enumerate(data):
+            update(i, item)
+        with open(path, "w") as file_json:
+            json.dump(data, file_json)
+
+    def lecturer(i, item):
+        item["unavailable"] = [{"day": i % 6, "shift": 1}, {"day": (i + 2) % 6, "shift": 2}]
+        item["max_classes_per_day"] = 1
+
+    rewrite("lecturers.json", lecturer)
+    rewrite("rooms.json", lambda i, item: item.update(capacity=20 + 10 * (i % 4)))
+    rewrite("courses.json", lambda i, item: item.update(num_students=15 + 5 * (i % 6)))
+    problem = ProblemInstance.read_json(data_dir)
+    assert all(constraint.active for constraint in problem.constraints.constraints)
+    return problem
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_conflict_index_matches_pairwise_count(problem, seed):
+    rng = random.Random(seed)
+    schedule = Schedule(problem, rng).initialize()
+    schedule.calculate_fitness()
+    for _ in range(30):
+        i = rng.randrange(problem.num_classes)
+        schedule.replace_gene(i, problem.sample_class(i, rng))
+        num_conflicts, flags = brute_force(schedule.classes)
+        assert schedule.get_num_conflicts() == num_conflicts
+        assert [clas.conflict for clas in schedule.classes] == flags
+        assert schedule.penalties()["lecturer_load"] == lecturer_load(schedule.classes)
+
+
+@pytest.mark.parametrize("name", [name for name in ConstraintSet.names() if name != ConstraintSet.CONFLICTS])
+def test_delta_matches_update(constrained_problem, name):
+    problem = constrained_problem
+    # Chỉ bật 1 ràng buộc (cùng với xung đột) để kiểm tra riêng từng loại
+    weights = {other: 0.0 for other in ConstraintSet.names() if other not in (name, ConstraintSet.CONFLICTS)}
+    weights[name] = 1.0
+    constraints = problem.constraints.weighted(weights)
+    rng = random.Random(name)
+    schedule = Schedule(problem, rng, constraints).initialize()
+    schedule.build_conflict_index()
+    conflict_index = schedule.conflict_index
+    penalty_changed = False
+    for _ in range(300):
+        i = rng.randrange(problem.num_classes)
+        clas = problem.sample_class(i, rng)
+        if rng.random() < 0.3:
+            # sample_class luôn chọn phòng đúng loại, thử cả phòng sai loại cho practice_room
+            clas.room = rng.choice(problem.rooms)
+        num_conflicts, fitness, penalties = conflict_index.num_conflicts, conflict_index.fitness(), schedule.penalties()
+        delta_conflicts, delta_cost = conflict_index.delta(i, clas.key())
+        schedule.replace_gene(i, clas)
+        assert conflict_index.num_conflicts - num_conflicts == delta_conflicts
+        assert cost(conflict_index.fitness()) - cost(fitness) == pytest.approx(delta_cost, abs=1e-9)
+        penalty_changed = penalty_changed or schedule.penalties()[name] != penalties[name]
+    assert penalty_changed
+
+    rebuilt = Schedule(problem, constraints=constraints)
+    rebuilt.classes.extend(clas.copy() for clas in schedule.classes)
+    rebuilt.build_conflict_index()
+    assert rebuilt.penalties() == schedule.penalties()
+    assert rebuilt.get_fitness() == pytest.approx(schedule.get_fitness())
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_vectorized_matches_calculate_fitness(problem, seed):
+    np = pytest.importorskip("numpy")
+    import vectorized
+
+    catalogue = vectorized.Catalogue(problem)
+    schedules = [Schedule(problem, random.Random(seed * 10 + k)).initialize() for k in range(4)]
+    genes = [catalogue.encode(schedule) for schedule in schedules]
+    rooms, days, shifts, lecturers = (np.stack(arrays) for arrays in zip(*genes))
+    num_conflicts, fitness = vectorized.evaluate(catalogue, rooms, days, shifts, lecturers)
+    for k, schedule in enumerate(schedules):
+        schedule.calculate_fitness()
+        assert num_conflicts[k] == schedule.get_num_conflicts()
+        assert fitness[k] == pytest.approx(schedule.get_fitness())
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_vectorized_matches_practice_room(constrained_problem, seed):
+    np = pytest.importorskip("numpy")
+    import vectorized
+
+    problem = constrained_problem
+    weights = {name: 0.0 for name in ConstraintSet.names() if name not in ("lecturer_load", "practice_room")}
+    constraints = problem.constraints.weighted(weights)
+    catalogue = vectorized.Catalogue(problem)
+    rng = random.Random(seed)
+    schedules = []
+    for _ in range(4):
+        schedule = Schedule(problem, rng, constraints).initialize()
+        for clas in schedule.classes:
+            clas.room = rng.choice(problem.rooms)
+        schedules.append(schedule)
+    genes = [catalogue.encode(schedule) for schedule in schedules]
+    rooms, days, shifts, lecturers = (np.stack(arrays) for arrays in zip(*genes))
+    _, fitness = vectorized.evaluate(catalogue, rooms, days, shifts, lecturers, constraints)
+    for k, schedule in enumerate(schedules):
+        schedule.calculate_fitness()
+        assert fitness[k] == pytest.approx(schedule.get_fitness())
+
+
+@pytest.mark.parametrize("name", ["availability", "room_capacity", "max_classes_per_day"])
+def test_vectorized_rejects_unsupported_constraints(constrained_problem, name):
+    np = pytest.importorskip("numpy")
+    import vectorized
+
+    problem = constrained_problem
+    catalogue = vectorized.Catalogue(problem)
+    genes = catalogue.encode(Schedule(problem, random.Random(0)).initialize())
+    weights = {other: 0.0 for other in ConstraintSet.names() if other != name}
+    with pytest.raises(ValueError):
+        vectorized.evaluate(catalogue, *(array[None] for array in genes), problem.constraints.weighted(weights))
+    weights[name] = 0.0
+    vectorized.evaluate(catalogue, *(array[None] for array in genes), problem.constraints.weighted(weights))
+
+
+def test_parse_weights():
+    assert parse_weights("conflicts=0.5, lecturer_load=2") == {"conflicts": 0.5, "lecturer_load": 2.0}
+    assert parse_weights({"availability": "1"}) == {"availability": 1.0}
+    assert parse_weights("") == {}
+
+
+@pytest.mark.parametrize("value", ["conflicts", "conflicts=high", "=1,", "conflicts:1"])
+def test_parse_weights_rejects_bad_input(value):
+    with pytest.raises(ValueError):
+        parse_weights(value)
+
+
+@pytest.mark.parametrize("weights", [{"unknown": 1.0}, {"conflicts": -1.0}])
+def test_invalid_weights_are_rejected(problem, weights):
+    with pytest.raises(ValueError):
+        problem.constraints.weighted(weights)
+    with pytest.raises(ValueError):
+        RunConfig(constraint_weights=weights)
@@ -0,0 +1,42 @@
+import threading
+
+from jobs import Job, JobManager
+
+
+class BlockingJob(Job):
+    """Công việc giữ luồng chạy cho tới khi được giải phóng, không đọc dữ liệu"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.release = threading.Event()
+
+    def run(self) -> None:
+        self.release.wait(5)
+
+
+def test_cancel_queued_job_frees_its_slot():
+    manager = JobManager(max_workers=1, max_active=2)
+    running = manager.submit(BlockingJob())
+    queued = manager.submit(Job())
+    try:
+        manager.cancel(queued.id)
+        assert queued.status == Job.CANCELLED
+        assert not queued.active
+        # Luồng sự kiện kết thúc ngay thay vì chờ tới lượt công việc
+        assert list(queued.events(timeout=0.1)) == []
+        other = manager.submit(BlockingJob())
+        other.release.set()
+    finally:
+        running.release.set()
+    queued.run()
+    assert queued.status == Job.CANCELLED
+
+
+def test_progress_history_is_bounded():
+    job = Job()
+    for generation in range(Job.MAX_PROGRESS + 10):
+        job.progress.append({"generation": generation})
+    assert len(job.progress) == Job.MAX_PROGRESS
+    assert job.to_dict()["progress"] == {"generation": Job.MAX_PROGRESS + 9}
+    assert [event["generation"] for event in job.history(Job.MAX_PROGRESS + 7)] == [Job.MAX_PROGRESS + 8,
+                                                                                     Job.MAX_PROGRESS + 9]
@@ -0,0 +1,33 @@
+import json
+import os
+import random
+
+from benchmark import generate_instance
+from schedule import ProblemInstance, Schedule
+
+
+def test_load_does_not_write_into_problem_registry(tmp_path):
+    data_dir = str(tmp_path)
+    generate_instance(data_dir, 10, 6, 8, seed=0)
+    problem = ProblemInstance.read_json(data_dir)
+    results_path = os.path.join(data_dir, "results.json")
+    Schedule(problem, random.Random(0)).initialize().save(results_path)
+
+    # Xoá 1 phòng đang được dùng, phòng đó chỉ còn trong file kết quả
+    schedule = Schedule.load(results_path, problem.registry)
+    removed = schedule[0].room.id
+    with open(os.path.join(data_dir, "rooms.json")) as file_json:
+        rooms = [room for room in json.load(file_json) if room["id"] != removed]
+    with open(os.path.join(data_dir, "rooms.json"), "w") as file_json:
+        json.dump(rooms, file_json)
+    problem = ProblemInstance.read_json(data_dir)
+    sizes = {name: len(getattr(problem.registry, name)) for name in ("lecturers", "rooms", "shifts", "courses")}
+
+    classes = Schedule.load(results_path, problem.registry)
+    assert {name: len(getattr(problem.registry, name)) for name in sizes} == sizes
+    for clas in classes:
+        if clas.room.id == removed:
+            assert clas.room.index >= len(problem.rooms)
+        else:
+            assert clas.room is problem.registry.rooms[clas.room.id]
+        assert clas.lecturer is problem.registry.lecturers[clas.lecturer.id]
@@ -0,0 +1,25 @@
+import argparse
+
+from genetic_algorithm import RunConfig
+
+
+def parse(*argv):
+    parser = argparse.ArgumentParser()
+    RunConfig.add_arguments(parser)
+    return RunConfig.from_args(parser.parse_args(argv))
+
+
+def test_arguments_default_to_run_config():
+    assert parse().to_dict() == RunConfig().to_dict()
+
+
+def test_arguments_cover_every_field():
+    config = parse("--population", "6", "--num-generations", "7", "--elite", "1", "--target-conflicts", "0",
+                   "--selection", "best", "--constraint-weights", "conflicts=0.5", "--seed", "3")
+    assert config.population_size == 6
+    assert config.num_generations == 7
+    assert config.num_of_elite == 1
+    assert config.target_conflicts == 0
+    assert config.selection == "best"
+    assert config.constraint_weights == {"conflicts": 0.5}
+    assert config.seed == 3
@@ -0,0 +1,316 @@
+import argparse
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from constraints import ConstraintSet, LecturerLoad, PracticeRoom
+from genetic_algorithm import Population, RunConfig
+from schedule import Class, ProblemInstance, Schedule, derive_rng
+
+
+class Catalogue:
+    """Dữ liệu bài toán dạng số nguyên cho engine vector hoá
+
+     Attributes:
+        - problem: Dữ liệu bài toán
+        - class_courses: chỉ số môn học của từng lớp
+        - class_pools: 1 nếu lớp là lớp thực hành, 0 nếu không
+        - room_table: bảng chỉ số phòng theo nhóm (không thực hành, thực hành)
+        - room_pool_sizes: số phòng của từng nhóm
+        - room_pools: 1 nếu phòng là phòng thực hành, 0 nếu không
+        - lecturer_table: bảng chỉ số giảng viên của từng môn học
+        - lecturer_counts: số giảng viên của từng môn học
+    """
+
+    def __init__(self, problem: Optional[ProblemInstance] = None) -> None:
+        self.problem = problem if problem is not None else ProblemInstance.load()
+        self.courses = self.problem.courses
+        self.rooms = self.problem.rooms
+        self.shifts = self.problem.shifts
+        self.lecturers = self.problem.lecturers
+
+        self.class_courses = np.array([course.index for course in self.problem.class_courses], dtype=np.int64)
+        self.class_pools = np.array([
+            int(course.is_practice) for course in self.problem.class_courses
+        ], dtype=np.int64)
+
+        pools = [
+            [room.index for room in self.problem.rooms_npractice],
+            [room.index for room in self.problem.rooms_practice],
+        ]
+        self.room_pool_sizes = np.array([len(pool) for pool in pools], dtype=np.int64)
+        self.room_table = np.zeros((2, max(self.room_pool_sizes)), dtype=np.int64)
+        for i, pool in enumerate(pools):
+            self.room_table[i, :len(pool)] = pool
+        self.room_pools = np.zeros(len(self.rooms), dtype=np.int64)
+        self.room_pools[pools[1]] = 1
+
+        self.lecturer_counts = np.array([len(course.lecturers) for course in self.courses], dtype=np.int64)
+        self.lecturer_table = np.zeros((len(self.courses), max(self.lecturer_counts)), dtype=np.int64)
+        for i, course in enumerate(self.courses):
+            self.lecturer_table[i, :len(course.lecturers)] = [lecturer.index for lecturer in course.lecturers]
+
+    @property
+    def num_classes(self) -> int:
+        return len(self.class_courses)
+
+    def encode(self, schedule: Schedule) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Chuyển 1 lịch học thành 4 mảng (phòng, ngày, ca, giảng viên)"""
+        rooms = np.array([clas.room.index for clas in schedule.classes], dtype=np.int64)
+        days = np.array([clas.day for clas in schedule.classes], dtype=np.int64)
+        shifts = np.array([clas.shift.index for clas in schedule.classes], dtype=np.int64)
+        lecturers = np.array([clas.lecturer.index for clas in schedule.classes], dtype=np.int64)
+        return rooms, days, shifts, lecturers
+
+    def decode(self, rooms: np.ndarray, days: np.ndarray, shifts: np.ndarray, lecturers: np.ndarray) -> Schedule:
+        """Chuyển 4 mảng (phòng, ngày, ca, giảng viên) thành lịch học"""
+        schedule = Schedule(self.problem)
+        for i in range(self.num_classes):
+            schedule.classes.append(Class(
+                id=i,
+                course=self.courses[self.class_courses[i]],
+                lecturer=self.lecturers[lecturers[i]],
+                room=self.rooms[rooms[i]],
+                day=int(days[i]),
+                shift=self.shifts[shifts[i]],
+            ))
+        schedule.calculate_fitness()
+        return schedule
+
+
+def derive_generator(seed: Optional[int] = None, *streams) -> np.random.Generator:
+    """Bộ sinh số ngẫu nhiên NumPy cho 1 luồng, sinh từ hạt giống gốc giống derive_rng"""
+    if seed is None:
+        return np.random.default_rng()
+    return np.random.default_rng(derive_rng(seed, *streams).getrandbits(128))
+
+
+class ArrayPopulation:
+    """Quần thể lưu dưới dạng mảng số nguyên kích thước (size x số lớp)
+
+     Attributes:
+        - rooms, days, shifts, lecturers: gene của toàn bộ quần thể
+        - fitness: độ thích nghi của từng cá thể
+        - num_conflicts: số xung đột của từng cá thể
+    """
+
+    def __init__(self, size: int, catalogue: Catalogue, rng: Optional[np.random.Generator] = None) -> None:
+        self.size = size
+        self.catalogue = catalogue
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.rooms, self.days, self.shifts, self.lecturers = random_genes(catalogue, self.rng, size)
+        self.fitness = np.full(size, -1.0)
+        self.num_conflicts = np.zeros(size, dtype=np.int64)
+
+    @classmethod
+    def from_population(cls, population: Population, catalogue: Catalogue, rng: Optional[np.random.Generator] = None) -> "ArrayPopulation":
+        array_population = cls(0, catalogue, rng)
+        encoded = [catalogue.encode(chromosome) for chromosome in population.chromosomes]
+        array_population.size = len(encoded)
+        array_population.rooms, array_population.days, array_population.shifts, array_population.lecturers = (
+            np.stack([genes[k] for genes in encoded]) for k in range(4))
+        array_population.fitness = np.full(array_population.size, -1.0)
+        array_population.num_conflicts = np.zeros(array_population.size, dtype=np.int64)
+        return array_population
+
+    def genes(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        return self.rooms, self.days, self.shifts, self.lecturers
+
+    def to_schedule(self, i: int) -> Schedule:
+        """Giải mã cá thể thứ i thành Schedule (dùng cho save() và hiển thị)"""
+        return self.catalogue.decode(self.rooms[i], self.days[i], self.shifts[i], self.lecturers[i])
+
+    def to_population(self) -> Population:
+        population = Population(0, self.catalogue.problem)
+        population.chromosomes = [self.to_schedule(i) for i in range(self.size)]
+        population.size = self.size
+        return population
+
+
+def random_genes(catalogue: Catalogue, rng: np.random.Generator, size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Sinh ngẫu nhiên gene hợp lệ cho `size` cá thể"""
+    shape = (size, catalogue.num_classes)
+    pools = np.broadcast_to(catalogue.class_pools, shape)
+    rooms = catalogue.room_table[pools, rng.integers(0, catalogue.room_pool_sizes[pools])]
+    days = rng.integers(0, len(Class.DAYS), shape)
+    shifts = rng.integers(0, len(catalogue.shifts), shape)
+    courses = np.broadcast_to(catalogue.class_courses, shape)
+    lecturers = catalogue.lecturer_table[courses, rng.integers(0, catalogue.lecturer_counts[courses])]
+    return rooms, days, shifts, lecturers
+
+
+def _count_pairs(keys: np.ndarray, num_keys: int) -> np.ndarray:
+    """Số cặp gene có cùng khoá trên từng hàng"""
+    size = keys.shape[0]
+    flat = (keys + np.arange(size, dtype=np.int64)[:, None] * num_keys).ravel()
+    uniq, counts = np.unique(flat, return_counts=True)
+    return np.bincount(uniq // num_keys, weights=counts * (counts - 1) // 2, minlength=size).astype(np.int64)
+
+
+def _later_duplicates(keys: np.ndarray, num_keys: int) -> np.ndarray:
+    """Đánh dấu gene i nếu trên cùng hàng có gene j > i cùng khoá"""
+    size, num_classes = keys.shape
+    flat = (keys + np.arange(size, dtype=np.int64)[:, None] * num_keys).ravel()
+    _, inverse = np.unique(flat, return_inverse=True)
+    positions = np.tile(np.arange(num_classes), size)
+    last = np.full(inverse.max() + 1, -1)
+    np.maximum.at(last, inverse, positions)
+    return (last[inverse] > positions).reshape(size, num_classes)
+
+
+def _keys(catalogue: Catalogue, rooms: np.ndarray, days: np.ndarray, shifts: np.ndarray, lecturers: np.ndarray) -> Tuple[Tuple[np.ndarray, int], Tuple[np.ndarray, int], Tuple[np.ndarray, int]]:
+    num_rooms = len(catalogue.rooms)
+    num_lecturers = len(catalogue.lecturers)
+    num_slots = len(Class.DAYS) * len(catalogue.shifts)
+    slots = days * len(catalogue.shifts) + shifts
+    room_keys = slots * num_rooms + rooms
+    lecturer_keys = slots * num_lecturers + lecturers
+    pair_keys = room_keys * num_lecturers + lecturers
+    return (
+        (room_keys, num_slots * num_rooms),
+        (lecturer_keys, num_slots * num_lecturers),
+        (pair_keys, num_slots * num_rooms * num_lecturers),
+    )
+
+
+VECTORIZED_CONSTRAINTS = (LecturerLoad, PracticeRoom)
+
+
+def check_constraints(constraints: ConstraintSet) -> None:
+    """Báo lỗi nếu có ràng buộc đang được tính (active, trọng số > 0) mà chưa được vector hoá"""
+    unsupported = [
+        constraint.name for constraint, _ in constraints.unary + constraints.grouped
+        if not isinstance(constraint, VECTORIZED_CONSTRAINTS)
+    ]
+    if unsupported:
+        raise ValueError("Constraints not supported by the vectorized engine: {} (set their weight to 0)".format(
+            ", ".join(unsupported)))
+
+
+def evaluate(catalogue: Catalogue, rooms: np.ndarray, days: np.ndarray, shifts: np.ndarray, lecturers: np.ndarray,
+             constraints: Optional[ConstraintSet] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Tính số xung đột và độ thích nghi cho cả quần thể
+
+    Tính xung đột và các ràng buộc trong VECTORIZED_CONSTRAINTS (mặc định theo
+    trọng số của catalogue.problem.constraints), cho cùng kết quả với
+    Schedule.calculate_fitness trên từng cá thể. Báo ValueError nếu có ràng
+    buộc khác đang được tính thay vì bỏ qua chúng.
+
+     Returns:
+        - Tuple[np.ndarray, np.ndarray]: (số xung đột, độ thích nghi)
+    """
+    constraints = constraints if constraints is not None else catalogue.problem.constraints
+    check_constraints(constraints)
+    (room_keys, num_room_keys), (lecturer_keys, num_lecturer_keys), (pair_keys, num_pair_keys) = \
+        _keys(catalogue, rooms, days, shifts, lecturers)
+    num_conflicts = _count_pairs(room_keys, num_room_keys) \
+        + _count_pairs(lecturer_keys, num_lecturer_keys) \
+        - _count_pairs(pair_keys, num_pair_keys)
+
+    size = lecturers.shape[0]
+    num_lecturers = len(catalogue.lecturers)
+    flat = (lecturers + np.arange(size, dtype=np.int64)[:, None] * num_lecturers).ravel()
+    loads = np.bincount(flat, minlength=size * num_lecturers).reshape(size, num_lecturers)
+    cost = num_conflicts * constraints.conflicts_weight
+    for constraint, weight in constraints.grouped:
+        if isinstance(constraint, LecturerLoad):
+            loss = np.where(
+                loads > 0,
+                np.maximum(loads - constraint.maximum, 0) + np.maximum(constraint.minimum - loads, 0),
+                0,
+            ).sum(axis=1)
+            cost = cost + loss * weight
+    for constraint, weight in constraints.unary:
+        if isinstance(constraint, PracticeRoom):
+            loss = (catalogue.room_pools[rooms] != catalogue.class_pools).sum(axis=1)
+            cost = cost + loss * weight
+
+    fitness = 1 / (cost + 1)
+    return num_conflicts, fitness
+
+
+def conflict_flags(catalogue: Catalogue, rooms: np.ndarray, days: np.ndarray, shifts: np.ndarray, lecturers: np.ndarray) -> np.ndarray:
+    """Cờ xung đột của từng gene, giống Class.conflict sau calculate_fitness"""
+    (room_keys, num_room_keys), (lecturer_keys, num_lecturer_keys), _ = \
+        _keys(catalogue, rooms, days, shifts, lecturers)
+    return _later_duplicates(room_keys, num_room_keys) | _later_duplicates(lecturer_keys, num_lecturer_keys)
+
+
+class VectorizedGeneticAlgorithm:
+    """Thuật toán di truyền thực hiện trên cả quần thể bằng phép toán mảng
+
+    Dùng cùng các toán tử với GeneticAlgorithm: giữ lại cá thể ưu tú, lai
+    đồng nhất từ 2 cá thể tốt nhất, đột biến và giai đoạn thích nghi. Ở giai
+    đoạn thích nghi mọi gene bị xung đột được thử thay cùng lúc thay vì lần lượt.
+    Chỉ dùng mutation_rate, num_of_elite, cycle_adaptation và
+    constraint_weights của RunConfig, cha mẹ luôn là 2 cá thể tốt nhất.
+    Các ràng buộc ngoài VECTORIZED_CONSTRAINTS phải có trọng số 0.
+    """
+    generation = 0
+
+    def __init__(self, config: Optional[RunConfig] = None) -> None:
+        self.config = config if config is not None else RunConfig()
+
+    def evolve(self, population: ArrayPopulation) -> ArrayPopulation:
+        self.generation += 1
+        if population.fitness[0] < 0:
+            self.__evaluate(population)
+        self.__crossover_population(population)
+        self.__mutate_population(population)
+        if self.generation % self.config.cycle_adaptation == 0:
+            self.__adaptive_population(population)
+        self.__evaluate(population)
+        return population
+
+    def __evaluate(self, population: ArrayPopulation) -> None:
+        constraints = population.catalogue.problem.constraints.weighted(self.config.constraint_weights)
+        population.num_conflicts, population.fitness = evaluate(population.catalogue, *population.genes(), constraints)
+        order = np.argsort(-population.fitness, kind="stable")
+        population.rooms, population.days, population.shifts, population.lecturers = (
+            genes[order] for genes in population.genes())
+        population.num_conflicts = population.num_conflicts[order]
+        population.fitness = population.fitness[order]
+
+    def __crossover_population(self, population: ArrayPopulation) -> None:
+        num_children = population.size - self.config.num_of_elite
+        mask = population.rng.random((num_children, population.catalogue.num_classes)) > 0.5
+        for genes in population.genes():
+            genes[self.config.num_of_elite:] = np.where(mask, genes[0], genes[1])
+
+    def __mutate_population(self, population: ArrayPopulation) -> None:
+        num_children = population.size - self.config.num_of_elite
+        mask = population.rng.random((num_children, population.catalogue.num_classes)) < self.config.mutation_rate
+        for genes, _genes in zip(population.genes(), random_genes(population.catalogue, population.rng, num_children)):
+            genes[self.config.num_of_elite:] = np.where(mask, _genes, genes[self.config.num_of_elite:])
+
+    def __adaptive_population(self, population: ArrayPopulation) -> None:
+        catalogue = population.catalogue
+        conflicted = conflict_flags(catalogue, *population.genes())
+        candidates = [
+            np.where(conflicted, _genes, genes)
+            for genes, _genes in zip(population.genes(), random_genes(catalogue, population.rng, population.size))
+        ]
+        accepted = conflicted & ~conflict_flags(catalogue, *candidates)
+        for genes, _genes in zip(population.genes(), candidates):
+            genes[accepted] = _genes[accepted]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    catalogue = Catalogue()
+    population = ArrayPopulation(10, catalogue, derive_generator(args.seed, "vectorized"))
+    genetic_algorithm = VectorizedGeneticAlgorithm()
+    start = time.perf_counter()
+    for i in range(50):
+        population = genetic_algorithm.evolve(population)
+        if population.fitness[0] == 1.0:
+            break
+    elapsed = time.perf_counter() - start
+    print("{} generations, {:.1f} generations/s, best fitness {}, conflicts {}".format(
+        genetic_algorithm.generation, genetic_algorithm.generation / elapsed,
+        population.fitness[0], population.num_conflicts[0]))
+    population.to_schedule(0).save()
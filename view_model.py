@@ -0,0 +1,162 @@
+import os
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from result_store import ResultStore
+from schedule import Class, Course, Lecturer, ProblemInstance, Room, Schedule, Shift
+
+
+class FrozenView:
+    """Đối tượng chỉ đọc dùng chung giữa các request"""
+    __slots__ = ("_fields",)
+
+    def __init__(self, **fields: Any) -> None:
+        object.__setattr__(self, "_fields", fields)
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self._fields[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("{} is read-only".format(type(self).__name__))
+
+    def __repr__(self) -> str:
+        return "<{} {}>".format(type(self).__name__, self._fields)
+
+
+def lecturer_view(lecturer: Lecturer) -> FrozenView:
+    return FrozenView(id=lecturer.id, name=lecturer.name)
+
+
+def room_view(room: Room) -> FrozenView:
+    return FrozenView(id=room.id, name=room.name)
+
+
+def shift_view(shift: Shift) -> FrozenView:
+    return FrozenView(id=shift.id, time=shift.time)
+
+
+def course_view(course: Course) -> FrozenView:
+    return FrozenView(
+        id=course.id,
+        name=course.name,
+        num_classes=course.num_classes,
+        is_practice=course.is_practice,
+        lecturers=tuple(lecturer_view(lecturer) for lecturer in course.lecturers or ()),
+    )
+
+
+class ScheduleView:
+    """Lịch học đã xếp ở dạng chỉ đọc
+
+     Attributes:
+        - classes: Danh sách lớp học (FrozenView), có sẵn thuộc tính `time`
+        - num_conflict: Số lớp bị xung đột
+        - by_lecturer: mã giảng viên -> các lớp
+        - by_course: mã môn học -> các lớp
+        - by_room: tên phòng -> các lớp
+        - by_slot: (ngày, mã ca) -> các lớp
+    """
+
+    def __init__(self, classes: Tuple[FrozenView, ...]) -> None:
+        self.classes = classes
+        self.num_conflict = sum(1 for clas in classes if clas.conflict)
+        self.by_lecturer = self.group(classes, lambda x: x.lecturer.id)
+        self.by_course = self.group(classes, lambda x: x.course.id)
+        self.by_room = self.group(classes, lambda x: x.room.name)
+        self.by_slot = self.group_by_slot(classes)
+
+    @staticmethod
+    def group(classes: Iterable[FrozenView], key) -> Dict[Any, Tuple[FrozenView, ...]]:
+        groups = {}  # type: Dict[Any, list]
+        for clas in classes:
+            groups.setdefault(key(clas), []).append(clas)
+        return {k: tuple(v) for k, v in groups.items()}
+
+    @classmethod
+    def group_by_slot(cls, classes: Iterable[FrozenView]) -> Dict[Tuple[int, int], Tuple[FrozenView, ...]]:
+        return cls.group(classes, lambda x: (x.day, x.shift.id))
+
+    def filter(self, lecturer: Optional[str] = None, course: Optional[str] = None, room: Optional[str] = None) -> Tuple[FrozenView, ...]:
+        """Lọc lớp học theo giảng viên, môn học hoặc phòng học bằng chỉ mục"""
+        if lecturer:
+            return self.by_lecturer.get(lecturer, ())
+        if course:
+            return self.by_course.get(course, ())
+        if room:
+            return self.by_room.get(room, ())
+        return self.classes
+
+    @classmethod
+    def from_classes(cls, classes) -> "ScheduleView":
+        courses, lecturers, rooms, shifts = {}, {}, {}, {}
+        views = []
+        for clas in classes:
+            if clas.course.id not in courses:
+                courses[clas.course.id] = course_view(clas.course)
+            if clas.lecturer.id not in lecturers:
+                lecturers[clas.lecturer.id] = lecturer_view(clas.lecturer)
+            if clas.room.id not in rooms:
+                rooms[clas.room.id] = room_view(clas.room)
+            if clas.shift.id not in shifts:
+                shifts[clas.shift.id] = shift_view(clas.shift)
+            views.append(FrozenView(
+                id=clas.id,
+                course=courses[clas.course.id],
+                lecturer=lecturers[clas.lecturer.id],
+                room=rooms[clas.room.id],
+                day=clas.day,
+                shift=shifts[clas.shift.id],
+                conflict=clas.conflict,
+                time=Class.DAYS[clas.day] + " " + clas.shift.time,
+            ))
+        return cls(tuple(views))
+
+
+class ViewCache:
+    """Bộ nhớ đệm dùng chung trong tiến trình cho lịch học và dữ liệu bài toán
+
+    Lịch học được đọc lại khi Schedule.save() ghi file hoặc khi thời gian sửa
+    đổi của file thay đổi. Dữ liệu bài toán dùng ProblemInstance.load().
+    """
+
+    def __init__(self, results_path: str = "./data/results.json", data_dir: str = "./data") -> None:
+        self.results_path = results_path
+        self.data_dir = data_dir
+        self.__lock = threading.Lock()
+        self.__schedule = None  # type: Optional[Tuple[Tuple, ScheduleView]]
+        self.__catalogue = None  # type: Optional[Tuple[ProblemInstance, Dict[str, Tuple[FrozenView, ...]]]]
+
+    def schedule(self) -> ScheduleView:
+        stat = os.stat(self.results_path)
+        key = (ResultStore.writes, stat.st_mtime_ns, stat.st_size)
+        with self.__lock:
+            if self.__schedule is None or self.__schedule[0] != key:
+                registry = ProblemInstance.load(self.data_dir).registry
+                self.__schedule = (key, ScheduleView.from_classes(Schedule.load(self.results_path, registry)))
+            return self.__schedule[1]
+
+    def courses(self) -> Tuple[FrozenView, ...]:
+        return self.__catalogue_views()["courses"]
+
+    def lecturers(self) -> Tuple[FrozenView, ...]:
+        return self.__catalogue_views()["lecturers"]
+
+    def rooms(self) -> Tuple[FrozenView, ...]:
+        return self.__catalogue_views()["rooms"]
+
+    def __catalogue_views(self) -> Dict[str, Tuple[FrozenView, ...]]:
+        problem = ProblemInstance.load(self.data_dir)
+        with self.__lock:
+            if self.__catalogue is None or self.__catalogue[0] is not problem:
+                self.__catalogue = (problem, {
+                    "courses": tuple(course_view(course) for course in problem.courses),
+                    "lecturers": tuple(lecturer_view(lecturer) for lecturer in problem.catalogue_lecturers),
+                    "rooms": tuple(room_view(room) for room in problem.rooms),
+                })
+            return self.__catalogue[1]
+
+
+view_cache = ViewCache()
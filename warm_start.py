@@ -0,0 +1,165 @@
+import random
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from constraints import ConstraintSet, Stability
+from genetic_algorithm import GeneticAlgorithm, Population, RunConfig, Termination
+from profiling import metrics
+from schedule import Class, ProblemInstance, Schedule
+
+
+class WarmStart:
+    """Xếp lại lịch học sau khi dữ liệu thay đổi, bắt đầu từ lịch học đã lưu
+
+    Lớp thứ k của mỗi môn học trong dữ liệu mới được ghép với lớp thứ k của
+    cùng môn học trong lịch học cũ (theo mã lớp). Cách xếp cũ được giữ nguyên
+    nếu giảng viên vẫn dạy môn học, phòng học vẫn còn và đúng loại, ca học
+    vẫn còn. Chỉ các lớp bị ảnh hưởng (lớp mới hoặc có giảng viên/phòng/ca
+    không còn hợp lệ) được xếp lại: giữ các thuộc tính còn hợp lệ nếu được,
+    chọn cách xếp có chi phí nhỏ nhất theo ConflictIndex.delta rồi ít thuộc
+    tính thay đổi nhất.
+
+    Thuật toán di truyền sau đó chạy với thêm ràng buộc Stability (phạt mỗi
+    lớp khác lịch cũ) nên chỉ đổi thêm lớp khác khi việc đó giảm được xung đột.
+    Nếu config không đặt target_conflicts, lần chạy dừng khi hết xung đột.
+
+     Attributes:
+        - problem: Dữ liệu bài toán mới
+        - config (RunConfig): tham số của lần chạy (target_conflicts mặc định 0)
+        - partial (List[Class]): lớp cũ ghép sang dữ liệu mới, thuộc tính không còn hợp lệ là None
+        - affected (List[int]): vị trí các lớp phải xếp lại
+        - num_new (int): số lớp không có trong lịch học cũ
+        - stability (Stability): ràng buộc giữ cách xếp của lịch học cũ
+        - constraints (ConstraintSet): ràng buộc của lần chạy cùng stability
+        - stop_reason (str): lý do dừng của lần gọi solve() gần nhất
+    """
+
+    def __init__(self, problem: ProblemInstance, previous: List[Class], config: Optional[RunConfig] = None,
+                 stability_weight: float = Stability.weight, rng: Optional[random.Random] = None) -> None:
+        self.problem = problem
+        self.config = config if config is not None else RunConfig()
+        if self.config.target_conflicts is None:
+            self.config = RunConfig(**dict(self.config.to_dict(), target_conflicts=0))
+        self.rng = rng if rng is not None else random
+        self.partial = []  # type: List[Class]
+        self.affected = []  # type: List[int]
+        self.num_new = 0
+        self.stop_reason = None  # type: Optional[str]
+
+        rooms = {room.id: room for room in problem.rooms}
+        shifts = {shift.id: shift for shift in problem.shifts}
+        lecturers = {lecturer.id: lecturer for lecturer in problem.lecturers}
+        by_course = {}  # type: Dict[str, List[Class]]
+        for clas in sorted(previous, key=lambda x: x.id):
+            by_course.setdefault(clas.course.id, []).append(clas)
+        baseline = []  # type: List[Optional[Tuple[int, int, int, int]]]
+        positions = {}  # type: Dict[str, int]
+        for i, course in enumerate(problem.class_courses):
+            k = positions.get(course.id, 0)
+            positions[course.id] = k + 1
+            old_classes = by_course.get(course.id, ())
+            if k >= len(old_classes):
+                self.partial.append(Class(i, course))
+                self.affected.append(i)
+                self.num_new += 1
+                baseline.append(None)
+                continue
+            old = old_classes[k]
+            room = rooms.get(old.room.id)
+            shift = shifts.get(old.shift.id)
+            lecturer = lecturers.get(old.lecturer.id)
+            # Khoá cũ theo chỉ số của dữ liệu mới, -1 nếu đối tượng không còn
+            baseline.append((old.day, shift.index if shift else -1, room.index if room else -1,
+                             lecturer.index if lecturer else -1))
+            if room is not None and room.is_practice != course.is_practice:
+                room = None
+            clas = Class(
+                i, course,
+                next((lecturer for lecturer in course.lecturers if lecturer.id == old.lecturer.id), None),
+                room,
+                old.day if 0 <= old.day < len(Class.DAYS) else None,
+                shift,
+            )
+            self.partial.append(clas)
+            if None in (clas.lecturer, clas.room, clas.day, clas.shift):
+                self.affected.append(i)
+
+        self.stability = Stability(problem, baseline)
+        constraints = problem.constraints.weighted(self.config.constraint_weights)
+        self.constraints = ConstraintSet(
+            constraints.constraints + [self.stability],
+            dict(constraints.weights, **{Stability.name: stability_weight}),
+        )
+
+    @metrics.timed("warm_start_repair")
+    def seed(self) -> Schedule:
+        """Lịch học cũ với các lớp bị ảnh hưởng đã được xếp lại"""
+        schedule = Schedule(self.problem, self.rng, self.constraints)
+        affected = set(self.affected)
+        for i, clas in enumerate(self.partial):
+            schedule.classes.append(self.problem.sample_class(i, self.rng) if i in affected else clas.copy())
+        schedule.build_conflict_index()
+        for i in self.affected:
+            best, best_cost = None, None
+            for candidate, num_changed in self.__candidates(self.partial[i]):
+                _, cost = schedule.conflict_index.delta(i, candidate.key())
+                if best_cost is None or (cost, num_changed) < best_cost:
+                    best, best_cost = candidate, (cost, num_changed)
+            schedule.replace_gene(i, best)
+        return schedule
+
+    def __candidates(self, partial: Class) -> Iterator[Tuple[Class, int]]:
+        """Mọi cách xếp của lớp cùng số thuộc tính còn hợp lệ bị thay đổi"""
+        problem = self.problem
+        course = partial.course
+        rooms = problem.rooms_practice if course.is_practice else problem.rooms_npractice
+        for lecturer in course.lecturers:
+            for day in range(len(Class.DAYS)):
+                for shift in problem.shifts:
+                    for room in rooms:
+                        num_changed = (partial.lecturer is not None and lecturer is not partial.lecturer) \
+                            + (partial.day is not None and day != partial.day) \
+                            + (partial.shift is not None and shift is not partial.shift) \
+                            + (partial.room is not None and room is not partial.room)
+                        yield Class(partial.id, course, lecturer, room, day, shift), num_changed
+
+    def population(self) -> Population:
+        """Quần thể gồm config.population_size bản sao của seed()"""
+        seed = self.seed()
+        seed.calculate_fitness()
+        population = Population(0, self.problem, self.rng, constraints=self.constraints)
+        population.chromosomes.append(seed)
+        for _ in range(self.config.population_size - 1):
+            chromosome = seed.copy()
+            chromosome.calculate_fitness()
+            population.chromosomes.append(chromosome)
+        population.size = len(population.chromosomes)
+        return population
+
+    def genetic_algorithm(self, evaluator=None) -> GeneticAlgorithm:
+        return GeneticAlgorithm(self.problem, evaluator, self.rng, self.config, self.constraints)
+
+    def solve(self, genetic_algorithm: Optional[GeneticAlgorithm] = None, population: Optional[Population] = None,
+              on_generation: Optional[Callable[[Population], bool]] = None) -> Population:
+        """Xếp lại lịch học, bỏ qua thuật toán di truyền nếu lịch sau khi sửa đã đạt config.target_conflicts
+
+         Args:
+            - genetic_algorithm (GeneticAlgorithm): mặc định genetic_algorithm()
+            - population (Population): quần thể khôi phục từ checkpoint, mặc định population()
+            - on_generation: hàm gọi sau mỗi thế hệ, giống GeneticAlgorithm.run
+
+         Returns:
+            - Population: quần thể cuối cùng
+        """
+        genetic_algorithm = genetic_algorithm if genetic_algorithm is not None else self.genetic_algorithm()
+        if population is None:
+            population = self.population()
+            if population.chromosomes[0].get_num_conflicts() <= self.config.target_conflicts:
+                self.stop_reason = Termination.TARGET_CONFLICTS
+                return population
+        population = genetic_algorithm.run(population, on_generation)
+        self.stop_reason = genetic_algorithm.stop_reason
+        return population
+
+    def num_changes(self, schedule: Schedule) -> int:
+        """Số lớp cũ có cách xếp khác với lịch học cũ (không tính lớp mới)"""
+        return sum(self.stability.penalty(i, clas.key()) for i, clas in enumerate(schedule.classes))